@@ -1,11 +1,25 @@
 
-import hashlib
+import argparse
+import itertools
+import json
 import os
+import sys
 from rich.console import Console
 from rich.prompt import Prompt
 from rich.table import Table
 from rich.prompt import Confirm
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from hashcore import algorithms, archive, daemon, fingerprint, knownhash, manifest, merkle, metrics, walker, watch
+from hashcore.cache import open_cache
+from hashcore.compare import compare_files as compare_files_fast
+from hashcore.engine import hash_file_multi, parse_algos
+from hashcore.parallel import DEFAULT_WORKERS, hash_many
+
+EXIT_OK = 0
+EXIT_DIFF = 1
+EXIT_ERROR = 2
+
 console = Console()
 lang = "en"
 
@@ -18,10 +32,12 @@ TEXTS = {
         "opt4": "[4] Change language",
         "opt0": "[0] Exit",
         "ask_path": "Enter file path",
-        "ask_alg": "Choose algorithm (md5 / sha1 / sha256 / sha512)",
+        "ask_alg": "Choose algorithm ({algos} / all)",
         "ask_compare": "Enter second file path to compare",
         "same": "[green]Files are identical.[/green]",
         "diff": "[red]Files differ.[/red]",
+        "diff_offset": "First difference at byte {offset}.",
+        "diff_size": "File sizes differ.",
         "exported": "[green]Hash exported to file.[/green]",
         "langset": "[cyan]Language switched.[/cyan]",
         "exit": "[yellow]Goodbye![/yellow]"
@@ -34,35 +50,32 @@ TEXTS = {
         "opt4": "[4] Sprache wechseln",
         "opt0": "[0] Beenden",
         "ask_path": "Dateipfad eingeben",
-        "ask_alg": "Algorithmus wählen (md5 / sha1 / sha256 / sha512)",
+        "ask_alg": "Algorithmus wählen ({algos} / all)",
         "ask_compare": "Zweiten Dateipfad zum Vergleichen eingeben",
         "same": "[green]Dateien sind identisch.[/green]",
         "diff": "[red]Dateien unterscheiden sich.[/red]",
+        "diff_offset": "Erster Unterschied bei Byte {offset}.",
+        "diff_size": "Dateigrößen unterscheiden sich.",
         "exported": "[green]Hash erfolgreich exportiert.[/green]",
         "langset": "[cyan]Sprache umgestellt.[/cyan]",
         "exit": "[yellow]Auf Wiedersehen![/yellow]"
     }
 }
 
-def hash_file(path, algorithm):
-    h = hashlib.new(algorithm)
-    with open(path, 'rb') as f:
-        while chunk := f.read(8192):
-            h.update(chunk)
-    return h.hexdigest()
-
 def check_hash():
     path = Prompt.ask(TEXTS[lang]["ask_path"])
     if not os.path.isfile(path):
         console.print("[red]File not found![/red]")
         return
-    alg = Prompt.ask(TEXTS[lang]["ask_alg"], default="sha256")
+    alg = Prompt.ask(TEXTS[lang]["ask_alg"].format(algos=" / ".join(algorithms.available())), default="sha256")
     try:
-        hashval = hash_file(path, alg)
+        digests = hash_file_multi(path, parse_algos(alg))
         table = Table(title=f"{alg.upper()} Hash")
         table.add_column("File", justify="left")
+        table.add_column("Algorithm", justify="left")
         table.add_column("Hash", justify="left")
-        table.add_row(os.path.basename(path), hashval)
+        for a, hashval in digests.items():
+            table.add_row(os.path.basename(path), a, hashval)
         console.print(table)
     except Exception as e:
         console.print(f"[red]Error: {e}[/red]")
@@ -73,24 +86,29 @@ def compare_files():
     if not all(os.path.isfile(p) for p in [f1, f2]):
         console.print("[red]One or both files not found.[/red]")
         return
-    alg = Prompt.ask(TEXTS[lang]["ask_alg"], default="sha256")
-    h1 = hash_file(f1, alg)
-    h2 = hash_file(f2, alg)
-    if h1 == h2:
+    result = compare_files_fast(f1, f2)
+    if result.equal:
         console.print(TEXTS[lang]["same"])
+    elif result.reason == "size":
+        console.print(TEXTS[lang]["diff"] + " " + TEXTS[lang]["diff_size"])
+    elif result.offset is not None:
+        console.print(TEXTS[lang]["diff"] + " " + TEXTS[lang]["diff_offset"].format(offset=result.offset))
     else:
-        console.print(TEXTS[lang]["diff"])
+        console.print(TEXTS[lang]["diff"] + f" ({result.reason})")
 
 def export_hash():
     path = Prompt.ask(TEXTS[lang]["ask_path"])
     if not os.path.isfile(path):
         console.print("[red]File not found![/red]")
         return
-    alg = Prompt.ask(TEXTS[lang]["ask_alg"], default="sha256")
-    h = hash_file(path, alg)
+    alg = Prompt.ask(TEXTS[lang]["ask_alg"].format(algos=" / ".join(algorithms.available())), default="sha256")
+    digests = hash_file_multi(path, parse_algos(alg))
     outname = f"{os.path.basename(path)}.{alg}.hash.txt"
     with open(outname, 'w') as f:
-        f.write(h)
+        if len(digests) == 1:
+            f.write(next(iter(digests.values())))
+        else:
+            f.writelines(f"{a} {h}\n" for a, h in digests.items())
     console.print(TEXTS[lang]["exported"] + f" → {outname}")
 
 def switch_language():
@@ -106,7 +124,468 @@ def show_menu():
     console.print(TEXTS[lang]["opt4"])
     console.print(TEXTS[lang]["opt0"])
 
+def iter_stdin_paths(null):
+    # Paths as they arrive on stdin, so hashing starts with the first one instead of after
+    # the producer (find, git ls-files, ...) has finished.
+    if not null:
+        for line in sys.stdin:
+            if line.strip():
+                yield line.rstrip("\n")
+        return
+    rest = b""
+    while True:
+        chunk = sys.stdin.buffer.read1(64 * 1024)
+        if not chunk:
+            break
+        *names, rest = (rest + chunk).split(b"\0")
+        for name in names:
+            if name:
+                yield os.fsdecode(name)
+    if rest:
+        yield os.fsdecode(rest)
+
+def iter_input_paths(args, skipped):
+    # Paths from the command line, or from stdin when none (or "-") are given. Directories
+    # given without -r are appended to skipped.
+    paths = [p for p in args.paths if p != "-"]
+    if not args.paths or "-" in args.paths:
+        paths = itertools.chain(paths, iter_stdin_paths(args.null))
+    for path in paths:
+        if os.path.isdir(path):
+            if args.recursive:
+                yield from manifest.walk_files(path, **walk_options(args))
+            else:
+                print(f"{path}: is a directory (use -r)", file=sys.stderr)
+                skipped.append(path)
+        else:
+            yield path
+
+def walk_options(args):
+    return {"include": args.include, "exclude": args.exclude, "min_size": args.min_size,
+            "max_size": args.max_size, "symlinks": args.symlinks, "max_depth": args.max_depth,
+            "same_fs": args.one_file_system, "dedupe_inodes": args.skip_hardlinks}
+
+def emit(args, record):
+    if args.format == "jsonl":
+        sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    elif "error" in record:
+        print(f"{record['path']}: {record['error']}", file=sys.stderr)
+    elif "status" in record:
+        sys.stdout.write(f"{record['path']}: {record['status']}\n")
+    elif record.get("mode") == fingerprint.FINGERPRINT:
+        # Tagged as e.g. SHA256-FINGERPRINT so sha256sum -c can never take it for a digest.
+        for a in args.algos:
+            sys.stdout.write(manifest.format_tagged_line(f"{a}-fingerprint", record[a], record["path"]))
+    elif len(args.algos) == 1:
+        sys.stdout.write(manifest.format_line(record[args.algos[0]], record["path"]))
+    else:
+        # BSD tagged lines carry the algorithm, and sha256sum -c understands them.
+        for a in args.algos:
+            sys.stdout.write(manifest.format_tagged_line(a, record[a], record["path"]))
+    sys.stdout.flush()
+
+def start_metrics(args):
+    # (Metrics, Profiler), either None unless asked for on the command line.
+    wanted = args.metrics_json or args.metrics_prom
+    return (metrics.Metrics() if wanted else None), (metrics.Profiler() if args.profile else None)
+
+def write_metrics(args, run_metrics, profiler):
+    if run_metrics is not None:
+        run_metrics.finish()
+        print(run_metrics.summary_line(), file=sys.stderr)
+        if args.metrics_json:
+            run_metrics.write_json(args.metrics_json)
+        if args.metrics_prom:
+            run_metrics.write_prometheus(args.metrics_prom, {"command": args.command})
+    if profiler is not None:
+        profiler.dump(args.profile)
+        warning = profiler.warning()
+        if warning:
+            print(warning, file=sys.stderr)
+
+def daemon_client(args):
+    # Thin client mode: a daemon.Client if --daemon was given and one answers, else None.
+    if args.daemon is None:
+        return None
+    client = daemon.connect(daemon.parse_address(args.daemon or None))
+    if client is None:
+        print("daemon not reachable, hashing locally", file=sys.stderr)
+    return client
+
+def open_known(args):
+    # KnownHashes for --known, or None. Raises ValueError if an index needs an algorithm
+    # that is not being computed.
+    if not args.known:
+        return None
+    known = knownhash.KnownHashes(args.known)
+    missing = [a for a in known.algos if a not in args.algos]
+    if missing:
+        known.close()
+        raise ValueError(f"--known needs -a {','.join(args.algos + missing)}")
+    return known
+
+def run_hash(args, paths, relative_to=None):
+    errors = 0
+    try:
+        known = open_known(args)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return EXIT_ERROR
+    client = daemon_client(args) if not args.fingerprint else None
+    cache = open_cache() if args.cache and client is None else None
+    mode = "process" if args.processes else "thread"
+    run_metrics, profiler = start_metrics(args) if client is None else (None, None)
+    def hash_locally(paths):
+        print("daemon connection lost, hashing locally", file=sys.stderr)
+        return hash_many(paths, args.algos, args.workers, mode=mode, drop_behind=args.drop_behind,
+                         direct=args.direct)
+
+    if client is not None:
+        paths = (p.path if isinstance(p, walker.FileEntry) else p for p in paths)
+        results = ((*r, fingerprint.FULL) for r in client.hash(paths, args.algos, fallback=hash_locally))
+    elif args.fingerprint:
+        # Known-hash lookups need real digests, so --known makes every file a full hash.
+        results = fingerprint.fingerprint_many(paths, args.algos, args.workers, args.samples,
+                                               strict=bool(known), cache=cache)
+    else:
+        results = ((*r, fingerprint.FULL) for r in hash_many(
+            paths, args.algos, args.workers, mode=mode, cache=cache, drop_behind=args.drop_behind,
+            direct=args.direct, metrics=run_metrics, profiler=profiler))
+    results = known.annotate(results) if known else ((*r, None) for r in results)
+    for path, digests, error, hash_mode, label in results:
+        name = os.path.relpath(path, relative_to) if relative_to else path
+        if error is None:
+            if args.only and (args.only == "known") != bool(label):
+                continue
+            record = {"path": name, **digests}
+            if args.fingerprint:
+                record["mode"] = hash_mode
+            if known:
+                record["known"] = label
+            emit(args, record)
+        else:
+            errors += 1
+            emit(args, {"path": name, "error": str(error)})
+    if cache:
+        cache.close()
+    if client is not None:
+        client.close()
+    if known:
+        known.close()
+    write_metrics(args, run_metrics, profiler)
+    return EXIT_ERROR if errors else EXIT_OK
+
+def cmd_hash(args):
+    skipped = []
+    status = run_hash(args, iter_input_paths(args, skipped))
+    return EXIT_ERROR if skipped else status
+
+def cmd_hash_tree(args):
+    if not os.path.isdir(args.folder):
+        print(f"{args.folder}: not a directory", file=sys.stderr)
+        return EXIT_ERROR
+    # Walker entries, not paths: local hashing and the cache reuse the stat of the walk.
+    return run_hash(args, walker.walk(args.folder, **walk_options(args)), relative_to=args.folder)
+
+def cmd_compare(args):
+    client = daemon_client(args)
+    result = None
+    try:
+        if client is not None:
+            with client:
+                try:
+                    result = client.compare(os.path.abspath(args.first), os.path.abspath(args.second))
+                except (OSError, ValueError, daemon.DaemonError):
+                    # Unreadable files fail again locally, with the local error message.
+                    print("daemon request failed, comparing locally", file=sys.stderr)
+        if result is None:
+            result = compare_files_fast(args.first, args.second)
+    except OSError as e:
+        print(e, file=sys.stderr)
+        return EXIT_ERROR
+    if args.format == "jsonl":
+        emit(args, {"first": args.first, "second": args.second, "equal": result.equal,
+                    "offset": result.offset, "reason": result.reason})
+    elif result.equal:
+        print("identical")
+    elif result.reason == "size":
+        print("differ in size")
+    elif result.offset is not None:
+        print(f"differ at byte {result.offset}")
+    else:
+        print(f"differ ({result.reason})")
+    return EXIT_OK if result.equal else EXIT_DIFF
+
+def cmd_verify(args):
+    def on_result(relpath, status):
+        if status != "OK" or not args.quiet:
+            emit(args, {"path": relpath, "status": status})
+
+    client = daemon_client(args)
+    if client is not None:
+        reported = []
+
+        def on_daemon_result(relpath, status):
+            reported.append(None)
+            on_result(relpath, status)
+
+        try:
+            with client:
+                report = client.verify(args.manifest, args.root, args.algos[0] if args.algo else None,
+                                       args.fail_fast, not args.ignore_new, on_daemon_result,
+                                       walk_options(args), args.cache)
+        except (OSError, ValueError, daemon.DaemonError) as e:
+            if reported:
+                # Half the results are out already; starting over would print them twice.
+                print(e, file=sys.stderr)
+                return EXIT_ERROR
+            print("daemon request failed, verifying locally", file=sys.stderr)
+        else:
+            print(report.summary(), file=sys.stderr)
+            if report.errors:
+                return EXIT_ERROR
+            return EXIT_OK if report.ok else EXIT_DIFF
+    cache = open_cache() if args.cache else None
+    run_metrics, profiler = start_metrics(args)
+    try:
+        report = manifest.verify_manifest(args.manifest, args.root, args.algos[0] if args.algo else None,
+                                          args.workers, fail_fast=args.fail_fast,
+                                          detect_new=not args.ignore_new, cache=cache, on_result=on_result,
+                                          walk_options=walk_options(args), drop_behind=args.drop_behind,
+                                          direct=args.direct, metrics=run_metrics, profiler=profiler)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return EXIT_ERROR
+    finally:
+        if cache:
+            cache.close()
+    write_metrics(args, run_metrics, profiler)
+    print(report.summary(), file=sys.stderr)
+    if report.errors:
+        return EXIT_ERROR
+    return EXIT_OK if report.ok else EXIT_DIFF
+
+def cmd_tree(args):
+    sidecar = args.sidecar or merkle.sidecar_path(args.file)
+    try:
+        if args.verify:
+            tree = merkle.read_sidecar(sidecar)
+            blocks = [int(b) for b in args.blocks.split(",")] if args.blocks else None
+            bad, ranges = merkle.verify_tree(args.file, tree, blocks, args.workers)
+            for start, end in ranges:
+                emit(args, {"path": args.file, "status": f"DAMAGED {start}-{end}"})
+            if args.format == "jsonl":
+                emit(args, {"path": args.file, "bad_blocks": bad, "ranges": ranges})
+            elif not ranges:
+                print(f"{args.file}: OK")
+            return EXIT_DIFF if ranges else EXIT_OK
+        tree = merkle.tree_hash(args.file, args.algos[0], args.block_size, args.workers)
+        if args.write:
+            merkle.write_sidecar(tree, sidecar)
+        name = f"tree-{args.algos[0]}"
+        if args.format == "jsonl":
+            emit(args, {"path": args.file, name: tree.hexdigest(), "blocks": len(tree.leaves)})
+        else:
+            # Tagged, so a tree root is never confused with a plain file digest.
+            sys.stdout.write(manifest.format_tagged_line(name, tree.hexdigest(), args.file))
+        return EXIT_OK
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return EXIT_ERROR
+
+def cmd_archive(args):
+    status = EXIT_OK
+    algo = args.algos[0]
+    if args.manifest and not args.algo:
+        # Hash with the manifest's algorithm, not the default.
+        try:
+            algo = manifest.manifest_algo(args.manifest)
+        except (OSError, ValueError) as e:
+            print(e, file=sys.stderr)
+            return EXIT_ERROR
+        args.algos = [algo]
+    for path in args.archives:
+        report = archive.verify_archive(path, algo, args.workers)
+        for m in report.members:
+            name = f"{path}:{m.name}"
+            emit(args, {"path": name, algo: m.digest} if m.ok else {"path": name, "error": str(m.error)})
+        if report.error is not None:
+            print(f"{path}: {report.error}", file=sys.stderr)
+        if report.kind == "unknown":
+            # Missing, unreadable or not an archive at all: nothing was checked.
+            status = EXIT_ERROR
+            continue
+        if not report.ok and status != EXIT_ERROR:
+            status = EXIT_DIFF
+        if args.manifest:
+            try:
+                result = archive.compare_to_manifest(report, args.manifest, args.prefix)
+            except (OSError, ValueError) as e:
+                print(e, file=sys.stderr)
+                return EXIT_ERROR
+            for label, names in (("FAILED", result.mismatched), ("MISSING", result.missing), ("NEW", result.new)):
+                for name in names:
+                    emit(args, {"path": name, "status": label})
+            print(f"{path}: {result.summary()}", file=sys.stderr)
+            if not result.ok and status != EXIT_ERROR:
+                status = EXIT_DIFF
+    return status
+
+def cmd_watch(args):
+    # Runs until interrupted. Prints one line per ADDED/MODIFIED/DELETED/ERROR event.
+    if not os.path.isdir(args.folder):
+        print(f"{args.folder}: not a directory", file=sys.stderr)
+        return EXIT_ERROR
+    cache = open_cache() if args.cache else None
+    watcher = watch.Watcher(args.folder, args.algos[0], args.workers, cache, settle=args.settle,
+                            interval=args.interval, backend="poll" if args.poll else "auto",
+                            walk_options=walk_options(args))
+    try:
+        for event in watcher.scan():
+            emit(args, {"path": event.path, "error": str(event.error)})
+        print(f"watching {len(watcher.index)} files ({watcher.backend})", file=sys.stderr)
+        for event in watcher.events():
+            name = os.path.relpath(event.path, args.folder)
+            if args.format == "jsonl":
+                emit(args, {**event.as_dict(), "path": name})
+            elif event.kind == watch.ERROR:
+                emit(args, {"path": name, "error": str(event.error)})
+            else:
+                emit(args, {"path": name, "status": f"{event.kind} {event.digest or event.old_digest}"})
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        if cache:
+            cache.close()
+    return EXIT_OK
+
+def cmd_known_import(args):
+    try:
+        count = knownhash.build(args.sources, args.output, args.algos[0], args.label or "",
+                                bloom=not args.no_bloom)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return EXIT_ERROR
+    print(f"{args.output}: {count} {args.algos[0]} digests", file=sys.stderr)
+    return EXIT_OK
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="CliHashChecker",
+        description="Batch mode. Without arguments the interactive menu starts.",
+        epilog="Exit codes: 0 ok, 1 differences found, 2 errors.")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-a", "--algo", help="algorithm, comma separated list or 'all' (default sha256)")
+    common.add_argument("-j", "--workers", type=int, default=DEFAULT_WORKERS, help="parallel workers")
+    common.add_argument("--processes", action="store_true", help="use a process pool (many small files)")
+    common.add_argument("--format", choices=["sums", "jsonl"], default="sums",
+                        help="sha256sum-style lines or JSON Lines")
+    common.add_argument("--cache", action="store_true", help="use the persistent hash cache")
+    common.add_argument("--drop-behind", action="store_true",
+                        help="evict hashed data from the page cache (keeps other programs' data hot)")
+    common.add_argument("--direct", action="store_true", help="read with O_DIRECT where the file system allows")
+    common.add_argument("--daemon", nargs="?", const="", metavar="ADDRESS",
+                        help="send the work to a running 'python -m hashcore.daemon' (falls back to local)")
+    common.add_argument("--metrics-json", metavar="FILE", help="write open/stat/read/hash timings as JSON")
+    common.add_argument("--metrics-prom", metavar="FILE", help="write the same as a Prometheus textfile")
+    common.add_argument("--profile", metavar="FILE", help="cProfile the hashing workers into a pstats file")
+    walking = argparse.ArgumentParser(add_help=False)
+    walking.add_argument("--include", action="append", default=[], metavar="GLOB",
+                         help="only files matching GLOB (name or relative path, repeatable)")
+    walking.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                         help="skip files and directories matching GLOB (repeatable)")
+    walking.add_argument("--min-size", type=int, help="skip files smaller than this many bytes")
+    walking.add_argument("--max-size", type=int, help="skip files larger than this many bytes")
+    walking.add_argument("--symlinks", choices=walker.SYMLINK_POLICIES, default="files",
+                         help="skip links, follow links to files only (default) or follow all")
+    walking.add_argument("--max-depth", type=int, help="directory levels to descend, 0 = top only")
+    walking.add_argument("--one-file-system", action="store_true", help="stay on the file system of the root")
+    walking.add_argument("--skip-hardlinks", action="store_true", help="hash and list each hard-linked file once")
+    lookup = argparse.ArgumentParser(add_help=False)
+    lookup.add_argument("--known", action="append", default=[], metavar="INDEX",
+                        help="look digests up in a known-hash index from known-import (repeatable)")
+    lookup.add_argument("--only", choices=["known", "unknown"], help="with --known: only print these files")
+    quick = argparse.ArgumentParser(add_help=False)
+    quick.add_argument("--fingerprint", action="store_true",
+                       help="quick triage: hash the size, head, tail and evenly spaced samples instead of "
+                            "everything; files with colliding fingerprints get full hashes")
+    quick.add_argument("--samples", type=int, default=fingerprint.SAMPLES,
+                       help=f"with --fingerprint: samples between head and tail (default {fingerprint.SAMPLES})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("hash", parents=[common, walking, lookup, quick], help="hash files")
+    p.add_argument("paths", nargs="*", help="files or directories, '-' or none reads stdin")
+    p.add_argument("-r", "--recursive", action="store_true", help="descend into directories")
+    p.add_argument("-0", "--null", action="store_true", help="stdin paths are NUL separated")
+    p.set_defaults(func=cmd_hash)
+
+    p = sub.add_parser("hash-tree", parents=[common, walking, lookup, quick], help="hash a directory with relative paths")
+    p.add_argument("folder")
+    p.set_defaults(func=cmd_hash_tree)
+
+    p = sub.add_parser("compare", parents=[common], help="compare two files byte by byte")
+    p.add_argument("first")
+    p.add_argument("second")
+    p.set_defaults(func=cmd_compare)
+
+    p = sub.add_parser("verify", parents=[common, walking], help="verify a tree against a manifest")
+    p.add_argument("manifest")
+    p.add_argument("--root", help="tree root (default: manifest directory)")
+    p.add_argument("--fail-fast", action="store_true", help="stop at the first failure")
+    p.add_argument("--ignore-new", action="store_true", help="don't report files missing from the manifest")
+    p.add_argument("-q", "--quiet", action="store_true", help="only print failures")
+    p.set_defaults(func=cmd_verify)
+
+    p = sub.add_parser("tree", parents=[common], help="parallel block tree hash of one large file")
+    p.add_argument("file")
+    p.add_argument("--block-size", type=int, default=merkle.BLOCK_SIZE)
+    p.add_argument("--write", action="store_true", help="store the block digests in a sidecar file")
+    p.add_argument("--verify", action="store_true", help="check the file against its sidecar")
+    p.add_argument("--blocks", help="with --verify: only re-read these block numbers (comma separated)")
+    p.add_argument("--sidecar", help=f"sidecar path (default: FILE{merkle.SIDECAR_SUFFIX})")
+    p.set_defaults(func=cmd_tree)
+
+    p = sub.add_parser("archive", parents=[common], help="check and hash zip/tar members without extracting")
+    p.add_argument("archives", nargs="+")
+    p.add_argument("--manifest", help="compare members with a manifest of the source tree")
+    p.add_argument("--prefix", default="", help="member name prefix to strip before comparing")
+    p.set_defaults(func=cmd_archive)
+
+    p = sub.add_parser("watch", parents=[common, walking], help="monitor a directory and hash what changes")
+    p.add_argument("folder")
+    p.add_argument("--settle", type=float, default=watch.SETTLE,
+                   help="seconds a file must stay unchanged before it is hashed")
+    p.add_argument("--interval", type=float, default=watch.POLL_INTERVAL, help="rescan interval when polling")
+    p.add_argument("--poll", action="store_true", help="poll with stat instead of inotify")
+    p.set_defaults(func=cmd_watch)
+
+    p = sub.add_parser("known-import", help="build a known-hash index from hash lists (NSRL, *sums files)")
+    p.add_argument("sources", nargs="+", help="text or CSV files with one or more hex digests per line")
+    p.add_argument("-o", "--output", required=True, help=f"index file to write (by convention *{knownhash.SUFFIX})")
+    p.add_argument("-a", "--algo", default="sha1", help="algorithm of the digests to import (default sha1)")
+    p.add_argument("--label", help="name reported for matches (default: output file name)")
+    p.add_argument("--no-bloom", action="store_true", help="leave out the Bloom filter (smaller, slower misses)")
+    p.set_defaults(func=cmd_known_import)
+    return parser
+
+def batch(argv):
+    args = build_parser().parse_args(argv)
+    try:
+        args.algos = parse_algos(args.algo or "sha256")
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return EXIT_ERROR
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        return 130
+    except BrokenPipeError:
+        return EXIT_OK
+
 def main():
+    if len(sys.argv) > 1:
+        sys.exit(batch(sys.argv[1:]))
     while True:
         show_menu()
         choice = Prompt.ask(">", choices=["0", "1", "2", "3", "4"], default="0")
@@ -1,8 +1,12 @@
 
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-import hashlib
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from hashcore import algorithms
+from hashcore.engine import hash_file
 
 lang = "en"
 
@@ -39,13 +43,6 @@ TEXTS = {
     }
 }
 
-def hash_file(filepath, algorithm):
-    h = hashlib.new(algorithm)
-    with open(filepath, 'rb') as f:
-        while chunk := f.read(8192):
-            h.update(chunk)
-    return h.hexdigest()
-
 def browse_file(entry):
     filepath = filedialog.askopenfilename()
     if filepath:
@@ -104,7 +101,7 @@ browse_btn.grid(row=1, column=1)
 
 algo_label = tk.Label(root, text=TEXTS[lang]["algorithm"])
 algo_label.grid(row=2, column=0, sticky="w")
-hash_algo = ttk.Combobox(root, values=["md5", "sha1", "sha256", "sha512"])
+hash_algo = ttk.Combobox(root, values=algorithms.available())
 hash_algo.set("sha256")
 hash_algo.grid(row=3, column=0, padx=5, pady=5, sticky="w")
 
@@ -1,8 +1,10 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
-import hashlib, os, time, csv
-import pandas as pd
+from tkinter import filedialog, messagebox, simpledialog, ttk
+import os, time, csv, queue, threading
 from datetime import datetime
+from hashcore import cache as hash_cache
+from hashcore import (algorithms, compare, daemon, dupes, engine, export, fingerprint, jobs, journal, knownhash,
+                      manifest, metrics, parallel, plugins, sessionlog, store, walker, watch)
 
 LANGS = {
     "en": {
@@ -39,6 +41,33 @@ LANGS = {
         "plugin_failed": "Plugin failed",
         "error_file": "File not found.",
         "error_folder": "Folder not found.",
+        "workers": "Workers",
+        "clear_cache": "Clear Cache",
+        "write_manifest": "Write Manifest",
+        "verify_manifest": "Verify Manifest",
+        "manifest_algo": "Algorithm of the digests in this manifest:",
+        "fail_fast": "Stop at first failure",
+        "diff_offset": "First difference at byte {offset}.",
+        "diff_size": "File sizes differ.",
+        "find_duplicates": "Find Duplicates",
+        "cancel": "Cancel",
+        "folder_plugins": "Plugins on folder",
+        "status_busy": "A job is already running.",
+        "status_cancelled": "Cancelled.",
+        "cache_cleared": "Hash cache cleared.",
+        "watch_folder": "Watch Folder",
+        "known_hashes": "Known Hashes",
+        "known_loaded": "Known-hash set {label}: {count} {algo} digests",
+        "known_matches": "{count} files found in known-hash sets",
+        "resume": "Resume",
+        "quick": "Quick fingerprint",
+        "resumed": "{count} files already done, continuing {output}",
+        "watching": "Watching {count} files ({backend}), Cancel stops.",
+        "include": "Include",
+        "exclude": "Exclude",
+        "same_fs": "Same filesystem",
+        "follow_links": "Follow links",
+        "walk_stats": "{files} files, {excluded} excluded, {hardlinks} hard links hashed once",
     },
     "de": {
         "app_title": "Datei-Hash Prüfer",
@@ -74,39 +103,74 @@ LANGS = {
         "plugin_failed": "Plugin fehlgeschlagen",
         "error_file": "Datei nicht gefunden.",
         "error_folder": "Ordner nicht gefunden.",
+        "workers": "Threads",
+        "clear_cache": "Cache leeren",
+        "write_manifest": "Manifest schreiben",
+        "verify_manifest": "Manifest prüfen",
+        "manifest_algo": "Algorithmus der Prüfsummen in diesem Manifest:",
+        "fail_fast": "Beim ersten Fehler abbrechen",
+        "diff_offset": "Erster Unterschied bei Byte {offset}.",
+        "diff_size": "Dateigrößen unterscheiden sich.",
+        "find_duplicates": "Duplikate suchen",
+        "cancel": "Abbrechen",
+        "folder_plugins": "Plugins für Ordner",
+        "status_busy": "Es läuft bereits ein Auftrag.",
+        "status_cancelled": "Abgebrochen.",
+        "cache_cleared": "Hash-Cache geleert.",
+        "watch_folder": "Ordner überwachen",
+        "known_hashes": "Bekannte Hashes",
+        "known_loaded": "Hash-Liste {label}: {count} {algo}-Hashes",
+        "known_matches": "{count} Dateien in Hash-Listen gefunden",
+        "resume": "Fortsetzen",
+        "quick": "Schnell-Fingerprint",
+        "resumed": "{count} Dateien bereits erledigt, setze {output} fort",
+        "watching": "Überwache {count} Dateien ({backend}), Abbrechen beendet.",
+        "include": "Nur",
+        "exclude": "Ausschließen",
+        "same_fs": "Gleiches Dateisystem",
+        "follow_links": "Links folgen",
+        "walk_stats": "{files} Dateien, {excluded} ausgeschlossen, {hardlinks} Hardlinks nur einmal gehasht",
     }
 }
 
+POLL_MS = 100
+# Log lines moved into the Text widget per poll, and lines the widget keeps at most.
+LOG_BATCH = 500
+LOG_WIDGET_LINES = 2000
+
 THEMES = {
     "light": {"bg": "#fafbfc", "fg": "#24292f", "entry": "#ffffff", "button": "#eaeaea"},
     "dark":  {"bg": "#23272e", "fg": "#b8c5d1", "entry": "#2d333b", "button": "#444c56"}
 }
 
-def get_plugins():
-    plugins = []
-    if os.path.isdir("plugins"):
-        for f in os.listdir("plugins"):
-            if f.endswith(".py"):
-                plugins.append(f)
-    return plugins
-
 class HashCheckerApp:
     def __init__(self, root):
         self.root = root
         self.lang = "en"
         self.theme = "light"
-        self.hashes = []
-        self.plugins = get_plugins()
-        self.log_entries = []
+        # Every result of the session, single files and folder runs, packed in columns.
+        self.hashes = store.ResultStore()
+        self.last_digests = {}
+        self.cache = hash_cache.open_cache()
+        # Thin client mode when `python -m hashcore.daemon` runs: warm cache, no start-up cost.
+        self.daemon = daemon.connect()
+        self.plugins = plugins.PluginRegistry()
+        self.known = knownhash.KnownHashes()
+        self.log = sessionlog.SessionLog()
         self.widgets = {}
+        self.lang_keys = {}
+        self.queue = queue.Queue()
+        self.job = None
         self.build_gui()
         self.set_theme()
         self.set_lang()
+        self.root.after(POLL_MS, self._poll)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def build_gui(self):
         l = LANGS[self.lang]
         self.root.title(l["app_title"])
-        self.root.geometry("760x620")
+        self.root.geometry("820x735")
         self.root.resizable(False, False)
 
         # ---- FILE SELECTION ----
@@ -121,10 +185,15 @@ class HashCheckerApp:
         hash_frame.pack(fill="x", padx=15, pady=5)
         hash_algo_label = tk.Label(hash_frame, text=l["hash_algo"])
         hash_algo_label.grid(row=0, column=0, padx=6, sticky="e")
-        self.widgets['algo_box'] = ttk.Combobox(hash_frame, values=["md5", "sha1", "sha256", "sha512"], width=10)
+        self.widgets['algo_box'] = ttk.Combobox(hash_frame, values=algorithms.available() + ["all"], width=10)
         self.widgets['algo_box'].set("sha256")
         self.widgets['algo_box'].grid(row=0, column=1, padx=5, pady=5, sticky="w")
         tk.Button(hash_frame, text=l["calculate"], command=self.calculate_hash).grid(row=0, column=2, padx=5, sticky="w")
+        tk.Label(hash_frame, text=l["workers"]).grid(row=0, column=3, padx=6, sticky="e")
+        self.widgets['workers_box'] = tk.Spinbox(hash_frame, from_=1, to=64, width=4)
+        self.widgets['workers_box'].delete(0, tk.END)
+        self.widgets['workers_box'].insert(0, parallel.DEFAULT_WORKERS)
+        self.widgets['workers_box'].grid(row=0, column=4, padx=5, sticky="w")
         self.result_var = tk.StringVar()
         self.widgets['result_entry'] = tk.Entry(hash_frame, textvariable=self.result_var, width=70)
         self.widgets['result_entry'].grid(row=1, column=0, columnspan=3, padx=6, pady=3, sticky="w")
@@ -155,12 +224,66 @@ class HashCheckerApp:
         # ---- FOLDER / EXPORT / MODE / LANG / PLUGINS ----
         ops_frame = tk.Frame(self.root)
         ops_frame.pack(fill="x", padx=15, pady=5)
-        tk.Button(ops_frame, text=l["folder_hash"], command=self.hash_folder).pack(side="left", padx=3)
-        tk.Button(ops_frame, text=l["export_csv"], command=self.export_csv).pack(side="left", padx=3)
-        tk.Button(ops_frame, text=l["dark_mode"], command=self.toggle_theme).pack(side="left", padx=3)
-        tk.Button(ops_frame, text=l["language"], command=self.switch_language).pack(side="left", padx=3)
-        tk.Button(ops_frame, text=l["plugins"], command=self.plugin_menu).pack(side="left", padx=3)
-        tk.Button(ops_frame, text=l["log"], command=self.save_log).pack(side="left", padx=3)
+        self._button(ops_frame, "folder_hash", self.hash_folder)
+        self._button(ops_frame, "export_csv", self.export_csv)
+        self._button(ops_frame, "dark_mode", self.toggle_theme)
+        self._button(ops_frame, "language", self.switch_language)
+        self._button(ops_frame, "plugins", self.plugin_menu)
+        self._button(ops_frame, "log", self.save_log)
+        self._button(ops_frame, "clear_cache", self.clear_cache)
+        self._button(ops_frame, "known_hashes", self.load_known_hashes)
+
+        # ---- MANIFEST ----
+        tools_frame = tk.Frame(self.root)
+        tools_frame.pack(fill="x", padx=15, pady=(0, 5))
+        self._button(tools_frame, "write_manifest", self.write_manifest)
+        self._button(tools_frame, "verify_manifest", self.verify_manifest)
+        self._button(tools_frame, "find_duplicates", self.find_duplicates)
+        self._button(tools_frame, "watch_folder", self.watch_folder)
+        self.fail_fast_var = tk.BooleanVar(value=False)
+        fail_fast = tk.Checkbutton(tools_frame, text=l["fail_fast"], variable=self.fail_fast_var)
+        fail_fast.pack(side="left", padx=3)
+        self.lang_keys[str(fail_fast)] = "fail_fast"
+        self.folder_plugins_var = tk.BooleanVar(value=False)
+        folder_plugins = tk.Checkbutton(tools_frame, text=l["folder_plugins"], variable=self.folder_plugins_var)
+        folder_plugins.pack(side="left", padx=3)
+        self.lang_keys[str(folder_plugins)] = "folder_plugins"
+        self.resume_var = tk.BooleanVar(value=False)
+        self.quick_var = tk.BooleanVar(value=False)
+        for key, var in (("resume", self.resume_var), ("quick", self.quick_var)):
+            check = tk.Checkbutton(tools_frame, text=l[key], variable=var)
+            check.pack(side="left", padx=3)
+            self.lang_keys[str(check)] = key
+        self.widgets['export_box'] = ttk.Combobox(tools_frame, values=list(export.FORMATS), width=8, state="readonly")
+        self.widgets['export_box'].set("csv")
+        self.widgets['export_box'].pack(side="right", padx=3)
+
+        # ---- FILTER ----
+        filter_frame = tk.Frame(self.root)
+        filter_frame.pack(fill="x", padx=15, pady=(0, 5))
+        for key, width in (("exclude", 28), ("include", 12)):
+            label = tk.Label(filter_frame, text=l[key])
+            label.pack(side="left", padx=3)
+            self.lang_keys[str(label)] = key
+            self.widgets[f'{key}_entry'] = tk.Entry(filter_frame, width=width)
+            self.widgets[f'{key}_entry'].pack(side="left", padx=3)
+        self.widgets['exclude_entry'].insert(0, ";".join(walker.JUNK_PATTERNS[:5]))
+        self.same_fs_var = tk.BooleanVar(value=False)
+        self.follow_links_var = tk.BooleanVar(value=False)
+        for key, var in (("same_fs", self.same_fs_var), ("follow_links", self.follow_links_var)):
+            check = tk.Checkbutton(filter_frame, text=l[key], variable=var)
+            check.pack(side="left", padx=3)
+            self.lang_keys[str(check)] = key
+
+        # ---- PROGRESS ----
+        progress_frame = tk.Frame(self.root)
+        progress_frame.pack(fill="x", padx=15, pady=(0, 5))
+        self.widgets['progress'] = ttk.Progressbar(progress_frame, length=300, maximum=100)
+        self.widgets['progress'].pack(side="left", padx=3)
+        self.widgets['cancel_btn'] = self._button(progress_frame, "cancel", self.cancel_job)
+        self.widgets['cancel_btn'].config(state="disabled")
+        self.progress_var = tk.StringVar()
+        tk.Label(progress_frame, textvariable=self.progress_var).pack(side="left", padx=6)
 
         # ---- LOG ----
         log_frame = tk.LabelFrame(self.root, text=l["log"])
@@ -173,6 +296,12 @@ class HashCheckerApp:
         status_bar = tk.Label(self.root, textvariable=self.status_var, anchor="w", relief="groove")
         status_bar.pack(fill="x", padx=0, pady=(0, 4))
 
+    def _button(self, frame, key, command):
+        btn = tk.Button(frame, text=LANGS[self.lang][key], command=command)
+        btn.pack(side="left", padx=3)
+        self.lang_keys[str(btn)] = key
+        return btn
+
     def set_theme(self):
         t = THEMES[self.theme]
         self.root.configure(bg=t["bg"])
@@ -183,7 +312,7 @@ class HashCheckerApp:
             if isinstance(widget, (tk.LabelFrame, tk.Frame)):
                 widget.configure(bg=t["bg"])
                 for child in widget.winfo_children():
-                    if isinstance(child, (tk.Label, tk.Button)):
+                    if isinstance(child, (tk.Label, tk.Button, tk.Checkbutton)):
                         try:
                             child.configure(bg=t["bg"], fg=t["fg"])
                         except tk.TclError:
@@ -225,10 +354,10 @@ class HashCheckerApp:
                     if LANGS["en"][key] in old or LANGS["de"][key] in old:
                         widget.config(text=l[key])
             elif isinstance(widget, tk.Frame):
-                for idx, btn in enumerate(widget.winfo_children()):
-                    txt_map = ["folder_hash", "export_csv", "dark_mode", "language", "plugins", "log"]
-                    if idx < len(txt_map):
-                        btn.config(text=l[txt_map[idx]])
+                for child in widget.winfo_children():
+                    key = self.lang_keys.get(str(child))
+                    if key:
+                        child.config(text=l[key])
         self.widgets['validate_label'].config(text="")
         self.widgets['compare_label'].config(text="")
 
@@ -246,42 +375,90 @@ class HashCheckerApp:
 
     def calculate_hash(self):
         path = self.widgets['file_entry'].get().strip()
-        algo = self.widgets['algo_box'].get()
+        algos = self._algos()
         if not os.path.isfile(path):
             self._status("error_file")
             return
         start = time.time()
-        h = self._hash_file(path, algo)
-        duration = time.time() - start
-        self.result_var.set(h)
-        self.duration_var.set(f"{duration:.2f} s")
-        self._log(f"{os.path.basename(path)} [{algo}]: {h}")
-        self.hashes.append({"file": path, "algo": algo, "hash": h, "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")})
-        self._status("status_success")
-
-    def _hash_file(self, path, algo):
-        h = hashlib.new(algo)
-        with open(path, "rb") as f:
-            while chunk := f.read(8192):
-                h.update(chunk)
-        return h.hexdigest()
+
+        def done(digests):
+            self.last_digests = digests
+            self.result_var.set(" ".join(digests.values()) if len(digests) == 1 else
+                                " ".join(f"{a}:{h}" for a, h in digests.items()))
+            self.duration_var.set(f"{time.time() - start:.2f} s")
+            for algo, h in digests.items():
+                self._log(f"{os.path.basename(path)} [{algo}]: {h}")
+            if self.known:
+                label = self.known.labels_many([digests])[0]
+                self._log(f"KNOWN: {os.path.basename(path)}: {label or '-'}")
+            self.hashes.add(path, digests)
+            self._status("status_success")
+
+        self._run_job(lambda job: self._hash_file(path, algos, job), done, os.path.getsize(path))
+
+    def _algos(self):
+        return engine.parse_algos(self.widgets['algo_box'].get())
+
+    def _row(self, path, digests, when=None, **extra):
+        return {"file": path, **digests, **extra,
+                "timestamp": time.strftime(store.TIMESTAMP_FORMAT, time.localtime(when))}
+
+    def _hash_file(self, path, algos, job=None):
+        if self.daemon is not None:
+            try:
+                digests = self.daemon.hash_file(path, algos)
+                if job is not None:
+                    job.add(os.path.getsize(path))
+                return digests
+            except daemon.FileError:
+                raise
+            except (OSError, ValueError, daemon.DaemonError):
+                # The daemon went away or stopped answering; carry on locally.
+                self.daemon.close()
+                self.daemon = None
+        digests = hash_cache.cached_hash(path, algos, self.cache, job=job)
+        if self.cache:
+            self.cache.flush()
+        return digests
 
     def compare_files(self):
         f1 = self.widgets['file_entry'].get().strip()
         f2 = self.widgets['compare_entry'].get().strip()
-        algo = self.widgets['algo_box'].get()
         if not (os.path.isfile(f1) and os.path.isfile(f2)):
             self._status("error_file")
             self.widgets['compare_label'].config(text=LANGS[self.lang]["error_file"], fg="red")
             return
-        h1 = self._hash_file(f1, algo)
-        h2 = self._hash_file(f2, algo)
-        if h1 == h2:
-            self.widgets['compare_label'].config(text=LANGS[self.lang]["status_valid"], fg="green")
-            self._log(f"COMPARE: Match {os.path.basename(f1)} = {os.path.basename(f2)}")
-        else:
-            self.widgets['compare_label'].config(text=LANGS[self.lang]["status_diff"], fg="red")
-            self._log(f"COMPARE: Difference {os.path.basename(f1)} ≠ {os.path.basename(f2)}")
+        algo = self._algos()[0]
+        start = time.time()
+
+        def done(result):
+            self.duration_var.set(f"{time.time() - start:.2f} s")
+            if result.equal:
+                self.widgets['compare_label'].config(text=LANGS[self.lang]["status_valid"], fg="green")
+                self._log(f"COMPARE: Match {os.path.basename(f1)} = {os.path.basename(f2)}")
+                return
+            if result.offset is not None:
+                detail = LANGS[self.lang]["diff_offset"].format(offset=result.offset)
+            elif result.reason == "size":
+                detail = LANGS[self.lang]["diff_size"]
+            else:
+                detail = result.reason
+            self.widgets['compare_label'].config(text=f"{LANGS[self.lang]['status_diff']} {detail}", fg="red")
+            self._log(f"COMPARE: Difference {os.path.basename(f1)} ≠ {os.path.basename(f2)} ({detail})")
+
+        total = os.path.getsize(f1) + os.path.getsize(f2)
+
+        def work(job):
+            if self.daemon is not None:
+                try:
+                    return self.daemon.compare(os.path.abspath(f1), os.path.abspath(f2))
+                except (OSError, ValueError, daemon.DaemonError):
+                    # Unreadable files fail again locally, with the local error message.
+                    self.daemon.close()
+                    self.daemon = None
+            return compare.compare_files(f1, f2, cache=self.cache, algo=algo, job=job)
+
+        self._run_job(work, done, total)
 
     def validate_hash(self):
         actual = self.result_var.get().strip().lower()
@@ -290,7 +467,11 @@ class HashCheckerApp:
             self.widgets['validate_label'].config(text=LANGS[self.lang]["status_empty"], fg="orange")
             self._status("status_empty")
             return
-        actual, expected = actual.replace(" ", ""), expected.replace(" ", "")
+        expected = expected.replace(" ", "")
+        if len(self.last_digests) > 1:
+            # Multi-algorithm result: validate against the digest with the matching length.
+            actual = next((h for h in self.last_digests.values() if len(h) == len(expected)), "")
+        actual = actual.replace(" ", "")
         if len(actual) != len(expected):
             self.widgets['validate_label'].config(text=LANGS[self.lang]["status_invalid"], fg="red")
             self._status("status_invalid")
@@ -308,44 +489,381 @@ class HashCheckerApp:
         if not folder:
             self._status("error_folder")
             return
-        algo = self.widgets['algo_box'].get()
-        results = []
+        algos = self._algos()
+        known = self.known if self.known else None
+        if known:
+            # Lookups need the digest the index was built from.
+            algos += [a for a in known.algos if a not in algos]
+        workers = self._workers()
+        outname = export.export_name("folder_hash_export", self._export_format())
+        hooks = self.plugins.folder_hooks() if self.folder_plugins_var.get() else []
+        options = self._walk_options()
+        tree = walker.Walker(folder, **options)
+        timings = metrics.Metrics()
+        # Completed rows also go to a journal (~/.filehashchecker/journals); after a crash or
+        # cancel, "Resume" replays them and only hashes the rest, into the same export file.
+        journal_path = journal.journal_path(folder)
+        resume = self.resume_var.get() and os.path.exists(journal_path)
+        quick = self.quick_var.get()
         start = time.time()
-        file_count = 0
-        error_count = 0
-        for rootdir, dirs, files in os.walk(folder):
-            for name in files:
-                path = os.path.join(rootdir, name)
+
+        def work(job):
+            nonlocal algos, outname, quick
+
+            def hash_results(entries):
+                if quick:
+                    # Sampled fingerprints; known-hash lookups need real digests.
+                    results = fingerprint.fingerprint_many(entries, algos, workers, strict=bool(known),
+                                                           cache=self.cache, job=job)
+                else:
+                    results = ((*r, fingerprint.FULL) for r in parallel.hash_many(
+                        entries, algos, workers, cache=self.cache, job=job, metrics=timings))
+                # Known-hash lookups go in batches, sorted within each batch.
+                return known.annotate(results) if known else ((*r, None) for r in results)
+
+            self._measure(folder, job, options)
+            fields = ["file", *algos, *(["mode"] if quick else []), *(["known"] if known else []), "timestamp"]
+            if resume:
+                run = journal.Journal(journal_path)
+                algos, outname, fields = run.header["algos"], run.header["output"], run.header["fields"]
+                quick = "mode" in fields
+                self._log("RESUME: " + LANGS[self.lang]["resumed"].format(count=len(run), output=outname))
+            else:
+                run = journal.Journal(journal_path, {"folder": folder, "algos": algos, "fields": fields,
+                                                     "output": outname})
+            error_count = known_count = 0
+            runner = plugins.PluginRunner(hooks, workers) if hooks else None
+            try:
+                with export.ResultWriter(outname, fields) as writer:
+                    for entry, result, row in run.merge(tree, hash_results):
+                        if row is not None:
+                            # Done before the interruption: same row, same place in the export.
+                            writer.write(row)
+                            self.hashes.add_row(row)
+                            known_count += bool(row.get("known"))
+                            job.add(entry.size)
+                            continue
+                        path, digests, error, mode, label = result
+                        if error is None:
+                            extra = {"mode": mode} if quick else {}
+                            if known:
+                                extra["known"] = label
+                                known_count += bool(label)
+                            now = time.time()
+                            row = self._row(path, digests, now, **extra)
+                            writer.write(row)
+                            run.add(entry, row)
+                            self.hashes.add(path, digests, now, **extra)
+                            self._log(f"[{','.join(algos)}] {path}: {' '.join(digests.values())}")
+                            if runner:
+                                runner.feed(path)
+                                for result in runner.ready():
+                                    self._log_plugin_result(*result)
+                        else:
+                            self._log(f"{os.path.basename(path)}: error ({str(error)})")
+                            error_count += 1
+                if runner:
+                    for result in runner.finish():
+                        self._log_plugin_result(*result)
+            except BaseException:
+                run.close()
+                raise
+            else:
+                run.discard()
+            finally:
+                if runner:
+                    runner.close()
+            if self.cache:
+                self.cache.flush()
+            return writer.rows, error_count, known_count
+
+        def done(result):
+            file_count, error_count, known_count = result
+            self.duration_var.set(f"{time.time() - start:.2f} s (folder)")
+            self._log_walk(tree)
+            timings.finish()
+            self._log(f"METRICS: {timings.summary_line()}")
+            for item in timings.summary()["slowest"][:3]:
+                self._log(f"SLOW: {item['path']} {item['seconds']:.3f} s ({item['mb_s']} MB/s)")
+            if self.cache:
+                self._log(self.cache.stats())
+            if known:
+                self._log("KNOWN: " + LANGS[self.lang]["known_matches"].format(count=known_count))
+            self._log(f"{LANGS[self.lang]['exported']} {outname} ({file_count} files, {error_count} errors)")
+
+        self._run_job(work, done)
+
+    def find_duplicates(self):
+        folder = filedialog.askdirectory()
+        if not folder:
+            self._status("error_folder")
+            return
+        algo = self._algos()[0]
+        workers = self._workers()
+        # Hard links must all be seen here: find_duplicates reports them as one group.
+        tree = walker.Walker(folder, **self._walk_options(), dedupe_inodes=False)
+        start = time.time()
+
+        def done(result):
+            groups, stats = result
+            self.duration_var.set(f"{time.time() - start:.2f} s (duplicates)")
+            for size, digest, paths in groups:
+                self._log(f"DUPLICATES ({size} bytes): {', '.join(paths)}")
+            self._log(f"DUPLICATES: {len(groups)} groups, {stats.summary()}")
+            if groups:
+                self._export_rows(dupes.duplicate_rows(groups, algo), "duplicates_export", f"{len(groups)} groups")
+            self._status("status_success")
+
+        self._run_job(lambda job: dupes.find_duplicates(tree, algo, workers, self.cache, job=job), done)
+
+    def watch_folder(self):
+        folder = filedialog.askdirectory()
+        if not folder:
+            self._status("error_folder")
+            return
+        algo = self._algos()[0]
+        watcher = watch.Watcher(folder, algo, self._workers(), self.cache, walk_options=self._walk_options())
+
+        def work(job):
+            # Runs until the Cancel button; events go straight to the log.
+            try:
+                for event in watcher.scan(job):
+                    self._log(f"{event.path}: error ({event.error})")
+                self._log(LANGS[self.lang]["watching"].format(count=len(watcher.index), backend=watcher.backend))
+                for event in watcher.events(job):
+                    if event.kind == watch.ERROR:
+                        self._log(f"{event.path}: error ({event.error})")
+                    else:
+                        self._log(f"WATCH {event.kind}: {event.path} {event.digest or event.old_digest}")
+                    if self.cache:
+                        self.cache.flush()
+            finally:
+                watcher.close()
+
+        self._run_job(work, None)
+
+    def load_known_hashes(self):
+        # .fhk indexes are opened directly; text or CSV lists are imported next to the list
+        # first, using the first selected algorithm.
+        paths = filedialog.askopenfilenames(title=LANGS[self.lang]["known_hashes"],
+                                            filetypes=[("Known-hash index", "*" + knownhash.SUFFIX),
+                                                       ("Hash lists", "*.txt *.csv *.sums"), ("All files", "*")])
+        if not paths:
+            return
+        algo = self._algos()[0]
+
+        def work(job):
+            indexes = []
+            for path in paths:
+                if path.endswith(knownhash.SUFFIX):
+                    indexes.append(path)
+                    continue
+                out = os.path.splitext(path)[0] + knownhash.SUFFIX
+                knownhash.build([path], out, algo, os.path.splitext(os.path.basename(path))[0])
+                indexes.append(out)
+            return indexes
+
+        def done(indexes):
+            for path in indexes:
                 try:
-                    h = self._hash_file(path, algo)
-                    results.append({"file": path, "algo": algo, "hash": h, "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")})
-                    self._log(f"[{algo}] {path}: {h}")
-                    file_count += 1
-                except Exception as e:
-                    self._log(f"{name}: error ({str(e)})")
-                    error_count += 1
-        duration = time.time() - start
-        self.duration_var.set(f"{duration:.2f} s (folder)")
-        outname = f"folder_hash_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+                    self.known.add(path)
+                except (OSError, ValueError) as e:
+                    self._log(f"{path}: error ({e})")
+                    continue
+                s = self.known.sets[-1]
+                self._log(LANGS[self.lang]["known_loaded"].format(label=s.label, count=len(s), algo=s.algo))
+            self._status("status_success")
+
+        self._run_job(work, done)
+
+    def _export_rows(self, rows, prefix, note=""):
+        outname = export.export_name(prefix, self._export_format())
         try:
-            pd.DataFrame(results).to_csv(outname, index=False)
-            self._log(f"{LANGS[self.lang]['exported']} {outname} ({file_count} files, {error_count} errors)")
+            with export.ResultWriter(outname, export.fieldnames_for(rows)) as writer:
+                writer.write_many(rows)
+            self._log(f"{LANGS[self.lang]['exported']} {outname}" + (f" ({note})" if note else ""))
         except Exception as e:
-            self._log(f"Folder export failed: {e}")
-            messagebox.showerror("Export Error", f"Could not save folder export:\n{e}")
+            self._log(f"Export failed: {e}")
+            messagebox.showerror("Export Error", f"Could not save export:\n{e}")
+
+    def _export_format(self):
+        fmt = self.widgets['export_box'].get()
+        return fmt if fmt in export.FORMATS else "csv"
+
+    def _workers(self):
+        try:
+            return max(1, int(self.widgets['workers_box'].get()))
+        except ValueError:
+            return parallel.DEFAULT_WORKERS
+
+    def write_manifest(self):
+        folder = filedialog.askdirectory()
+        if not folder:
+            self._status("error_folder")
+            return
+        algo = self._algos()[0]
+        out = filedialog.asksaveasfilename(initialdir=folder, initialfile=f"{algo.upper()}SUMS")
+        if not out:
+            return
+        workers = self._workers()
+        options = self._walk_options()
+        start = time.time()
+
+        def work(job):
+            self._measure(folder, job, {**options, "dedupe_inodes": False})
+            return manifest.write_manifest(folder, out, algo, workers, self.cache, job=job,
+                                           walk_options=options)
+
+        def done(result):
+            written, errors = result
+            self.duration_var.set(f"{time.time() - start:.2f} s (manifest)")
+            for path, error in errors:
+                self._log(f"{os.path.basename(path)}: error ({error})")
+            self._log(f"MANIFEST: {out} ({written} files, {len(errors)} errors)")
+            self._status("status_success")
+
+        self._run_job(work, done)
+
+    def verify_manifest(self):
+        path = filedialog.askopenfilename(title=LANGS[self.lang]["verify_manifest"])
+        if not path:
+            return
+        try:
+            algo = manifest.guess_algo(path)
+        except (OSError, ValueError) as e:
+            self._log(f"Error: {e}")
+            self._status("status_invalid")
+            return
+        if algo is None:
+            # The digest length fits several algorithms: ask rather than guess, a wrong
+            # guess would report every file as a mismatch.
+            algo = simpledialog.askstring(LANGS[self.lang]["verify_manifest"], LANGS[self.lang]["manifest_algo"],
+                                          initialvalue=self._algos()[0], parent=self.root)
+            if not algo:
+                return
+            algo = algo.strip().lower()
+        folder = filedialog.askdirectory(initialdir=os.path.dirname(path)) or os.path.dirname(path)
+        workers = self._workers()
+        fail_fast = self.fail_fast_var.get()
+        options = self._walk_options()
+        start = time.time()
+
+        def work(job):
+            self._measure(folder, job)
+            # No hash cache here: it is keyed on size and mtime, and an integrity check has to
+            # read what is on disk now.
+            return manifest.verify_manifest(path, folder, algo, workers=workers, fail_fast=fail_fast,
+                                            job=job, walk_options=options)
+
+        def done(report):
+            self.duration_var.set(f"{time.time() - start:.2f} s (verify)")
+            for label, names in (("MISMATCH", report.mismatched), ("MISSING", report.missing), ("NEW", report.new)):
+                for name in names:
+                    self._log(f"{label}: {name}")
+            for name, error in report.errors:
+                self._log(f"{name}: error ({error})")
+            self._log(f"VERIFY: {report.summary()}")
+            self._status("status_valid" if report.ok else "status_diff")
+
+        self._run_job(work, done)
+
+    def _walk_options(self):
+        return {
+            "include": walker.split_patterns(self.widgets['include_entry'].get()),
+            "exclude": walker.split_patterns(self.widgets['exclude_entry'].get()),
+            "symlinks": "follow" if self.follow_links_var.get() else "files",
+            "same_fs": self.same_fs_var.get(),
+        }
+
+    def _log_walk(self, tree):
+        stats = tree.stats
+        self._log("WALK: " + LANGS[self.lang]["walk_stats"].format(
+            files=stats.files, excluded=stats.excluded, hardlinks=stats.hardlinks))
+        for path, error in stats.errors:
+            self._log(f"{path}: error ({error})")
+
+    def _measure(self, folder, job, options=None):
+        # Sums the tree size next to the hashing so the progress bar gets an ETA early.
+        # This is a second walk of the tree, directory reads and stats included; they are
+        # cheap next to reading the files and mostly served from the dentry cache.
+        def run():
+            for entry in walker.walk(folder, **(options or {})):
+                if job.cancelled:
+                    return
+                job.add_total(entry.size)
+            job.total_known = True
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _run_job(self, work, done, total=0):
+        # work(job) runs on a background thread and must not touch Tk; done(result) runs
+        # on the Tk thread once _poll picks the result up from the queue.
+        if self.job is not None:
+            self._status("status_busy")
+            return
+        self.job = jobs.Job(total)
+        self.widgets['progress']['value'] = 0
+        self.widgets['cancel_btn'].config(state="normal")
+
+        def run(job):
+            try:
+                self.queue.put(("done", done, work(job)))
+            except jobs.Cancelled:
+                self.queue.put(("cancelled", None, None))
+            except Exception as e:
+                self.queue.put(("error", None, e))
+
+        threading.Thread(target=run, args=(self.job,), daemon=True).start()
+
+    def cancel_job(self):
+        if self.job is not None:
+            self.job.cancel()
+
+    def _poll(self):
+        try:
+            while True:
+                kind, callback, payload = self.queue.get_nowait()
+                self._update_progress()
+                self.job = None
+                self.widgets['cancel_btn'].config(state="disabled")
+                if kind == "done":
+                    callback(payload)
+                elif kind == "cancelled":
+                    self._log(LANGS[self.lang]["status_cancelled"])
+                    self._status("status_cancelled")
+                else:
+                    self._log(f"Error: {payload}")
+                    self._status("status_invalid")
+        except queue.Empty:
+            pass
+        if self.job is not None:
+            self._update_progress()
+        self._flush_log()
+        self.root.after(POLL_MS, self._poll)
+
+    def _update_progress(self):
+        job = self.job
+        self.widgets['progress']['value'] = job.fraction() * 100
+        text = f"{job.bytes_done / 1e6:.1f}"
+        if job.bytes_total:
+            text += f" / {job.bytes_total / 1e6:.1f}"
+        text += f" MB · {job.rate() / 1e6:.1f} MB/s"
+        eta = job.eta()
+        if eta is not None:
+            text += f" · ETA {eta:.0f} s"
+        self.progress_var.set(text)
 
     def export_csv(self):
         if not self.hashes:
             self._log(LANGS[self.lang]["nothing_export"])
             return
-        outname = f"hash_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        try:
-            df = pd.DataFrame(self.hashes)
-            df.to_csv(outname, index=False)
-            self._log(f"{LANGS[self.lang]['exported']} {outname}")
-        except Exception as e:
-            self._log(f"CSV export failed: {e}")
-            messagebox.showerror("Export Error", f"Could not save CSV export:\n{e}")
+        outname = export.export_name("hash_export", self._export_format())
+
+        def done(count):
+            per_row = self.hashes.nbytes() / len(self.hashes)
+            self._log(f"{LANGS[self.lang]['exported']} {outname} ({count} rows, {per_row:.0f} bytes/row in memory)")
+
+        self._run_job(lambda job: self.hashes.export(outname), done)
 
     def toggle_theme(self):
         self.theme = "dark" if self.theme == "light" else "light"
@@ -356,14 +874,16 @@ class HashCheckerApp:
         self.set_lang()
 
     def plugin_menu(self):
-        if not self.plugins:
+        self.plugins.refresh()
+        names = self.plugins.names()
+        if not names:
             self._log("No plugins found.")
             return
         win = tk.Toplevel(self.root)
         win.title(LANGS[self.lang]["plugins"])
         tk.Label(win, text=LANGS[self.lang]["choose_plugin"]).pack()
-        plugin_var = tk.StringVar(value=self.plugins[0])
-        plugin_menu = ttk.Combobox(win, textvariable=plugin_var, values=self.plugins)
+        plugin_var = tk.StringVar(value=names[0])
+        plugin_menu = ttk.Combobox(win, textvariable=plugin_var, values=names)
         plugin_menu.pack()
 
         def run_plugin():
@@ -372,38 +892,74 @@ class HashCheckerApp:
             if not file_path:
                 messagebox.showinfo(LANGS[self.lang]["plugins"], LANGS[self.lang]["plugin_no_file"])
                 return
+            win.destroy()
             try:
-                import importlib.util
-                spec = importlib.util.spec_from_file_location("plugin", os.path.join("plugins", plugin_file))
-                plugin = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(plugin)
-                result = plugin.check(file_path)
-                msg = LANGS[self.lang]["plugin_done"] if result else LANGS[self.lang]["plugin_failed"]
-                self._log(f"{plugin_file}: {msg}")
-                win.destroy()
+                self.plugins.get(plugin_file)
             except Exception as e:
                 self._log(f"{LANGS[self.lang]['plugin_failed']}: {str(e)}")
-                win.destroy()
+                return
+
+            def done(results):
+                for name, path, result in results:
+                    self._log_plugin_result(name, path, result)
+
+            self._run_job(lambda job: self.plugins.run(plugin_file, [file_path], timeout=plugins.DEFAULT_TIMEOUT), done)
 
         tk.Button(win, text=LANGS[self.lang]["run_plugin"], command=run_plugin).pack(pady=8)
 
+    def _log_plugin_result(self, name, path, result):
+        if isinstance(result, Exception):
+            self._log(f"{name}: {os.path.basename(path)}: {LANGS[self.lang]['plugin_failed']} ({result})")
+        else:
+            msg = LANGS[self.lang]["plugin_done"] if result else LANGS[self.lang]["plugin_failed"]
+            self._log(f"{name}: {os.path.basename(path)}: {msg}")
+
     def save_log(self):
         out = f"hash_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
         try:
             with open(out, "w", newline="", encoding="utf-8") as f:
                 writer = csv.writer(f)
-                for line in self.log_entries:
+                for line in self.log:
                     writer.writerow([line])
             self._log(f"{LANGS[self.lang]['exported']} {out}")
         except Exception as e:
             self._log(f"Log export failed: {e}")
             messagebox.showerror("Log Export", f"Failed to save log:\n{e}")
 
+    def clear_cache(self):
+        if not self.cache:
+            return
+        self.cache.invalidate()
+        self._log(LANGS[self.lang]["cache_cleared"])
+
     def _log(self, msg):
-        t = time.strftime("%H:%M:%S")
-        self.widgets['log_text'].insert(tk.END, f"[{t}] {msg}\n")
-        self.widgets['log_text'].see(tk.END)
-        self.log_entries.append(f"[{t}] {msg}")
+        # Safe from worker threads; the widget is updated in batches by _flush_log.
+        self.log.write(msg)
+
+    def _flush_log(self):
+        lines, skipped = self.log.drain(LOG_BATCH)
+        if not lines and not skipped:
+            return
+        text = self.widgets['log_text']
+        if skipped:
+            text.insert(tk.END, f"... {skipped} lines only in saved log ...\n")
+        if lines:
+            text.insert(tk.END, "\n".join(lines) + "\n")
+        excess = int(text.index("end-1c").split(".")[0]) - LOG_WIDGET_LINES
+        if excess > 0:
+            text.delete("1.0", f"{excess + 1}.0")
+        text.see(tk.END)
+
+    def on_close(self):
+        if self.job is not None:
+            self.job.cancel()
+        if self.cache:
+            self.cache.close()
+        if self.daemon is not None:
+            self.daemon.close()
+        self.known.close()
+        self.log.close()
+        self.root.destroy()
 
     def _status(self, key):
         self.status_var.set(LANGS[self.lang].get(key, key))
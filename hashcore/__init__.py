@@ -0,0 +1,12 @@
+from .algorithms import THROUGHPUT_TARGETS, available, register
+from .engine import (
+    ALGORITHMS, BUFFER_SIZE, MMAP_THRESHOLD,
+    hash_file, hash_file_multi, parse_algos,
+)
+from .parallel import DEFAULT_WORKERS, hash_many
+
+__all__ = [
+    "ALGORITHMS", "BUFFER_SIZE", "MMAP_THRESHOLD", "THROUGHPUT_TARGETS",
+    "hash_file", "hash_file_multi", "parse_algos",
+    "DEFAULT_WORKERS", "hash_many", "available", "register",
+]
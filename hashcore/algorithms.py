@@ -0,0 +1,60 @@
+import hashlib
+
+# Optional very fast non-cryptographic hashes, for change detection only.
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+class Algorithm:
+    def __init__(self, name, factory, cryptographic=True, target=None, collision_resistant=None):
+        self.name = name
+        self.factory = factory
+        self.cryptographic = cryptographic
+        # md5 and sha1 are cryptographic but have practical collisions: fine to spot
+        # corruption, not to vouch for files someone else could have prepared.
+        self.collision_resistant = cryptographic if collision_resistant is None else collision_resistant
+        # Single-core MB/s target, warm page cache (see README "Performance").
+        self.target = target
+        self.digest_size = factory().digest_size
+
+    def new(self):
+        return self.factory()
+
+
+REGISTRY = {}
+
+
+def register(name, factory, cryptographic=True, target=None, collision_resistant=None):
+    REGISTRY[name] = Algorithm(name, factory, cryptographic, target, collision_resistant)
+
+
+def get(name):
+    try:
+        return REGISTRY[name]
+    except KeyError:
+        raise ValueError(f"unsupported hash type {name}") from None
+
+
+def new(name):
+    return get(name).new()
+
+
+def available(cryptographic_only=False):
+    return [a.name for a in REGISTRY.values() if a.cryptographic or not cryptographic_only]
+
+
+register("md5", hashlib.md5, target=650, collision_resistant=False)
+register("sha1", hashlib.sha1, target=1500, collision_resistant=False)
+register("sha256", hashlib.sha256, target=1500)
+register("sha512", hashlib.sha512, target=800)
+register("blake2b", hashlib.blake2b, target=900)
+register("blake2s", hashlib.blake2s, target=600)
+register("sha3_256", hashlib.sha3_256, target=450)
+register("sha3_512", hashlib.sha3_512, target=250)
+if xxhash is not None:
+    register("xxh3_64", xxhash.xxh3_64, cryptographic=False, target=20000)
+    register("xxh3_128", xxhash.xxh3_128, cryptographic=False, target=20000)
+
+THROUGHPUT_TARGETS = {a.name: a.target for a in REGISTRY.values()}
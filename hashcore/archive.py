@@ -0,0 +1,178 @@
+import os
+import stat
+import tarfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from . import algorithms
+from .engine import BUFFER_SIZE
+from .manifest import VerifyReport, iter_manifest
+from .parallel import DEFAULT_WORKERS
+
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+
+class MemberResult:
+    def __init__(self, name, size, digest=None, error=None):
+        self.name = name
+        self.size = size
+        self.digest = digest
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class ArchiveReport:
+    def __init__(self, path, kind, algo, members, error=None, symlinks=()):
+        self.path = path
+        self.kind = kind
+        self.algo = algo
+        self.members = members
+        # Archive-level failure (unreadable directory, truncated tar stream, ...).
+        self.error = error
+        # Names of symlink members: they have no content to hash.
+        self.symlinks = list(symlinks)
+
+    @property
+    def corrupt(self):
+        return [m for m in self.members if not m.ok]
+
+    @property
+    def ok(self):
+        return self.error is None and not self.corrupt
+
+    def summary(self):
+        text = f"{self.path}: {len(self.members)} members, {len(self.corrupt)} corrupt"
+        return text + (f", archive error: {self.error}" if self.error else "")
+
+
+def _hash_stream(f, algo, buffer_size, job):
+    h = algorithms.new(algo)
+    while chunk := f.read(buffer_size):
+        h.update(chunk)
+        if job is not None:
+            job.add(len(chunk))
+    return h.hexdigest()
+
+
+def verify_zip(path, algo="sha256", workers=DEFAULT_WORKERS, buffer_size=BUFFER_SIZE, job=None):
+    # Every member is decompressed in memory, CRC-checked and hashed; nothing touches the
+    # disk. Each worker holds its own ZipFile handle, so members are read in parallel and
+    # a bad member doesn't stop the others from being checked.
+    try:
+        with zipfile.ZipFile(path) as z:
+            infos = [i for i in z.infolist() if not i.is_dir()]
+    except (OSError, zipfile.BadZipFile) as e:
+        return ArchiveReport(path, "zip", algo, [], e)
+    # Info-ZIP stores symlinks as members holding the target path, flagged in the mode bits.
+    symlinks = [i.filename for i in infos if stat.S_ISLNK(i.external_attr >> 16)]
+    infos = [i for i in infos if not stat.S_ISLNK(i.external_attr >> 16)]
+    local = threading.local()
+    handles = []
+    lock = threading.Lock()
+
+    def check(info):
+        z = getattr(local, "zip", None)
+        if z is None:
+            z = local.zip = zipfile.ZipFile(path)
+            with lock:
+                handles.append(z)
+        try:
+            # ZipExtFile raises BadZipFile on a CRC mismatch once the member is read out.
+            with z.open(info) as f:
+                return MemberResult(info.filename, info.file_size, _hash_stream(f, algo, buffer_size, job))
+        except Exception as e:
+            if job is not None and job.cancelled:
+                raise
+            return MemberResult(info.filename, info.file_size, error=e)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            members = list(pool.map(check, infos))
+    finally:
+        for z in handles:
+            z.close()
+    return ArchiveReport(path, "zip", algo, members, symlinks=symlinks)
+
+
+def verify_tar(path, algo="sha256", buffer_size=BUFFER_SIZE, job=None):
+    # Compressed tar streams can only be read front to back, so members are hashed in
+    # order from a single pass over the archive. A hard link member carries no data and
+    # gets the result of the earlier member it links to.
+    members = []
+    symlinks = []
+    by_name = {}
+    try:
+        with tarfile.open(path, "r|*") as tar:
+            for info in tar:
+                if info.issym():
+                    symlinks.append(info.name)
+                    continue
+                if info.islnk():
+                    target = by_name.get(info.linkname)
+                    if target is None:
+                        error = tarfile.TarError(f"hard link to {info.linkname}, which is not in the archive before it")
+                        members.append(MemberResult(info.name, 0, error=error))
+                    else:
+                        members.append(MemberResult(info.name, target.size, target.digest, target.error))
+                    continue
+                if not info.isfile():
+                    continue
+                try:
+                    f = tar.extractfile(info)
+                    member = MemberResult(info.name, info.size, _hash_stream(f, algo, buffer_size, job))
+                except (OSError, tarfile.TarError, EOFError) as e:
+                    members.append(MemberResult(info.name, info.size, error=e))
+                    raise
+                members.append(member)
+                by_name[info.name] = member
+    except (OSError, tarfile.TarError, EOFError) as e:
+        return ArchiveReport(path, "tar", algo, members, e, symlinks)
+    return ArchiveReport(path, "tar", algo, members, symlinks=symlinks)
+
+
+def is_archive(path):
+    return path.lower().endswith((".zip",) + TAR_SUFFIXES)
+
+
+def verify_archive(path, algo="sha256", workers=DEFAULT_WORKERS, buffer_size=BUFFER_SIZE, job=None):
+    # A missing or unreadable path comes back as kind "unknown" with the OSError.
+    try:
+        if zipfile.is_zipfile(path):
+            return verify_zip(path, algo, workers, buffer_size, job)
+        if tarfile.is_tarfile(path):
+            return verify_tar(path, algo, buffer_size, job)
+    except OSError as e:
+        return ArchiveReport(path, "unknown", algo, [], e)
+    return ArchiveReport(path, "unknown", algo, [], ValueError("not a zip or tar archive"))
+
+
+def compare_to_manifest(report, manifest_path, prefix=""):
+    # Checks archive members against a manifest of the source tree. The manifest is
+    # streamed; members are matched by name after stripping prefix (e.g. "backup/").
+    # Manifest lines for paths that are symlinks in the archive are left out: the
+    # archive has the link, not the content the manifest hashed through it.
+    def strip(name):
+        return name[len(prefix):] if prefix and name.startswith(prefix) else name
+
+    digests = {strip(m.name): m for m in report.members}
+    symlinks = {strip(name) for name in report.symlinks}
+    result = VerifyReport()
+    for digest, relpath in iter_manifest(manifest_path, report.algo):
+        name = relpath.replace(os.sep, "/")
+        if name in symlinks:
+            continue
+        member = digests.pop(name, None)
+        if member is None:
+            result.missing.append(name)
+        elif not member.ok:
+            result.errors.append((name, member.error))
+        elif member.digest == digest:
+            result.matched += 1
+        else:
+            result.mismatched.append(name)
+    result.new.extend(sorted(digests))
+    return result
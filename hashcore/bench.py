@@ -0,0 +1,311 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+from . import algorithms
+from .engine import ALGORITHMS, hash_file_multi
+from .manifest import walk_files
+from .parallel import hash_many
+from .walker import Walker
+
+KIB = 1024
+MIB = 1024 * KIB
+GIB = 1024 * MIB
+
+# name -> (file count, file size). "full" is the reference set for release numbers, "quick"
+# finishes in well under a minute and is meant for comparing two commits locally. "large"
+# is the single-file dataset; it holds real random data, since a sparse file reads holes
+# without touching the disk and a cold run on it would only measure copying and hashing.
+PRESETS = {
+    "full": {
+        "small": (1_000_000, 4 * KIB),
+        "medium": (10_000, 1 * MIB),
+        "large": (1, 4 * GIB),
+    },
+    "quick": {
+        "small": (2_000, 4 * KIB),
+        "medium": (100, 1 * MIB),
+        "large": (1, 256 * MIB),
+    },
+}
+# Large files are written in chunks of fresh random data, so generating them needs little memory.
+GENERATE_CHUNK = 64 * MIB
+DEFAULT_BUFFERS = (64 * KIB, 1 * MIB, 4 * MIB)
+DEFAULT_WORKERS = (1, 4, os.cpu_count() or 1)
+
+
+def generate(root, preset="quick"):
+    # Builds (or reuses) the synthetic datasets below root; returns {name: directory}.
+    datasets = {}
+    for name, (count, size) in PRESETS[preset].items():
+        folder = os.path.join(root, f"{preset}-{name}")
+        datasets[name] = folder
+        marker = os.path.join(folder, ".complete")
+        if os.path.exists(marker):
+            continue
+        os.makedirs(folder, exist_ok=True)
+        block = os.urandom(min(size, GENERATE_CHUNK))
+        for i in range(count):
+            # 1000 files per directory keeps the walk realistic and the directories small.
+            sub = os.path.join(folder, f"{i // 1000:04d}")
+            if i % 1000 == 0:
+                os.makedirs(sub, exist_ok=True)
+            path = os.path.join(sub, f"f{i:07d}.bin")
+            with open(path, "wb") as f:
+                # Vary the first bytes so no two files are identical.
+                f.write(i.to_bytes(8, "little") + block[8:])
+                for offset in range(len(block), size, GENERATE_CHUNK):
+                    f.write(os.urandom(min(GENERATE_CHUNK, size - offset)))
+        with open(marker, "w") as f:
+            f.write(json.dumps({"count": count, "size": size}))
+    return datasets
+
+
+def drop_cache(paths):
+    # Best effort cold cache: evicts clean pages of the given files. Needs no privileges
+    # but only works where posix_fadvise exists (Linux); elsewhere runs stay warm.
+    # Returns False if any file could not be dropped.
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    dropped = True
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            dropped = False
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            dropped = False
+        finally:
+            os.close(fd)
+    return dropped
+
+
+def _files(folder):
+    return [p for p in walk_files(folder) if not p.endswith(".complete")]
+
+
+def _measure(run, files, cache_state, repeat):
+    # Returns (best seconds, dropped): dropped is None for warm runs, else whether every
+    # cold run really started from a dropped cache.
+    best = None
+    dropped = None if cache_state == "warm" else True
+    for _ in range(repeat):
+        if cache_state == "cold":
+            dropped = drop_cache(files) and dropped
+        else:
+            # Make sure "warm" really is warm, independent of what ran before.
+            for _ in hash_many(files, ["md5"], os.cpu_count() or 1):
+                pass
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, dropped
+
+
+def bench_file(name, path, algos, buffers, cache_states, repeat):
+    size = os.path.getsize(path)
+    for algo in algos:
+        for buffer_size in buffers:
+            for state in cache_states:
+                seconds, dropped = _measure(lambda: hash_file_multi(path, [algo], buffer_size), [path], state, repeat)
+                yield _record("file", name, algo, buffer_size, 1, state, seconds, size, 1, dropped)
+
+
+def bench_folder(name, folder, algos, workers_list, cache_states, repeat, buffer_size=1 * MIB):
+    files = _files(folder)
+    size = sum(os.path.getsize(p) for p in files)
+    for algo in algos:
+        for workers in workers_list:
+            for state in cache_states:
+                def run():
+                    for _ in hash_many(files, [algo], workers, buffer_size=buffer_size):
+                        pass
+                seconds, dropped = _measure(run, files, state, repeat)
+                yield _record("folder", name, algo, buffer_size, workers, state, seconds, size, len(files), dropped)
+
+
+def _walk_os(folder):
+    # What the folder functions did before the scandir walker: os.walk plus a stat per file.
+    size = 0
+    for rootdir, dirs, files in os.walk(folder):
+        dirs.sort()
+        for name in sorted(files):
+            size += os.stat(os.path.join(rootdir, name)).st_size
+    return size
+
+
+def _walk_scandir(folder):
+    return sum(entry.size for entry in Walker(folder))
+
+
+def drop_dentries():
+    # Dropping dentries and inodes needs root; without it the cold walk runs stay warm.
+    try:
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("2\n")
+        return True
+    except OSError:
+        return False
+
+
+def bench_walk(name, folder, cache_states, repeat):
+    files = _files(folder)
+    size = sum(os.path.getsize(p) for p in files)
+    for label, walk in (("os.walk", _walk_os), ("scandir", _walk_scandir)):
+        for state in cache_states:
+            best = None
+            dropped = None if state == "warm" else True
+            for _ in range(repeat):
+                if state == "cold":
+                    dropped = drop_dentries() and dropped
+                else:
+                    walk(folder)
+                start = time.perf_counter()
+                walk(folder)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            yield _record("walk", name, label, 0, 1, state, best, size, len(files), dropped)
+
+
+def _record(mode, dataset, algo, buffer_size, workers, cache, seconds, size, files, dropped=None):
+    # cache_dropped is False for a "cold" run whose cache drop failed: it ran warm.
+    return {
+        "mode": mode, "dataset": dataset, "algo": algo, "buffer_size": buffer_size,
+        "workers": workers, "cache": cache, "cache_dropped": dropped, "seconds": round(seconds, 6),
+        "bytes": size, "files": files, "mb_s": round(size / seconds / 1e6, 2) if seconds else None,
+        "files_s": round(files / seconds, 2) if seconds else None,
+    }
+
+
+def _cache_label(record):
+    return record["cache"] + ("?" if record.get("cache_dropped") is False else "")
+
+
+def _key(r):
+    return r["mode"], r["dataset"], r["algo"], r["buffer_size"], r["workers"], r["cache"]
+
+
+def compare(results, baseline, threshold=0.10):
+    # Returns (record, baseline MB/s) for every measurement that got slower than threshold.
+    # Cold runs whose cache drop failed on either side measured something else and are
+    # left out.
+    old = {_key(r): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        b = old.get(_key(r))
+        if b and False in (r.get("cache_dropped"), b.get("cache_dropped")):
+            continue
+        if b and b["mb_s"] and r["mb_s"] and r["mb_s"] < b["mb_s"] * (1 - threshold):
+            regressions.append((r, b["mb_s"]))
+    return regressions
+
+
+def recommend(size=64 * MIB, chunk=1 * MIB, repeat=3):
+    # Hashes size bytes in chunk sized updates, as the engine does, with every registered
+    # algorithm; the best of repeat rounds counts. Returns the fastest collision resistant
+    # one (integrity: sha256, sha512, blake2, sha3; never md5 or sha1), the fastest overall
+    # (change detection, may be xxh3) and {name: MB/s}. Pure CPU numbers, so they hold
+    # for warm-cache scans.
+    data = memoryview(os.urandom(chunk))
+    updates = max(1, size // chunk)
+    speeds = {}
+    for name in algorithms.available():
+        best = None
+        for _ in range(repeat):
+            h = algorithms.new(name)
+            start = time.perf_counter()
+            for _ in range(updates):
+                h.update(data)
+            h.digest()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        speeds[name] = round(updates * chunk / best / 1e6, 1)
+    integrity = [n for n in speeds if algorithms.get(n).collision_resistant]
+    return max(integrity, key=speeds.get), max(speeds, key=speeds.get), speeds
+
+
+def environment():
+    return {
+        "python": platform.python_version(), "platform": platform.platform(),
+        "machine": platform.machine(), "cpus": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m hashcore.bench",
+                                     description="Hashing throughput and scaling benchmark.")
+    parser.add_argument("--root", default="bench_data", help="where synthetic trees are kept")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    parser.add_argument("--algos", default=",".join(ALGORITHMS))
+    parser.add_argument("--buffers", default=",".join(str(b) for b in DEFAULT_BUFFERS),
+                        help="buffer sizes in bytes for single-file runs")
+    parser.add_argument("--workers", default=",".join(str(w) for w in sorted(set(DEFAULT_WORKERS))))
+    parser.add_argument("--cache", choices=["cold", "warm", "both"], default="both")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per point, the best one counts")
+    parser.add_argument("--output", help="write JSON results here (default stdout)")
+    parser.add_argument("--baseline", help="earlier JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown, 0.10 = 10%%")
+    parser.add_argument("--recommend", action="store_true",
+                        help="only print the fastest algorithm on this CPU and exit")
+    args = parser.parse_args(argv)
+
+    integrity, fastest, speeds = recommend()
+    if args.recommend:
+        for name, mb_s in sorted(speeds.items(), key=lambda kv: -kv[1]):
+            print(f"{name:10} {mb_s:>9} MB/s")
+        print(f"recommended: {integrity} (integrity), {fastest} (change detection)")
+        return 0
+
+    algos = [a for a in args.algos.split(",") if a]
+    buffers = [int(b) for b in args.buffers.split(",") if b]
+    workers = [int(w) for w in args.workers.split(",") if w]
+    states = ["cold", "warm"] if args.cache == "both" else [args.cache]
+
+    datasets = generate(args.root, args.preset)
+    results = []
+    large = _files(datasets["large"])
+    for record in bench_file("large", large[0], algos, buffers, states, args.repeat):
+        results.append(record)
+        print(f"{record['mode']:6} {record['dataset']:12} {record['algo']:8} buf={record['buffer_size']:>8} "
+              f"{_cache_label(record):5} {record['mb_s']:>9} MB/s", file=sys.stderr)
+    for name in ("small", "medium"):
+        for record in bench_folder(name, datasets[name], algos, workers, states, args.repeat):
+            results.append(record)
+            print(f"{record['mode']:6} {record['dataset']:12} {record['algo']:8} workers={record['workers']:>3} "
+                  f"{_cache_label(record):5} {record['mb_s']:>9} MB/s {record['files_s']:>10} files/s", file=sys.stderr)
+    for record in bench_walk("small", datasets["small"], states, args.repeat):
+        results.append(record)
+        print(f"{record['mode']:6} {record['dataset']:12} {record['algo']:8} "
+              f"{_cache_label(record):5} {record['files_s']:>10} files/s", file=sys.stderr)
+    if any(r["cache_dropped"] is False for r in results):
+        print("cold?: the cache could not be dropped (dentries need root), these ran warm", file=sys.stderr)
+
+    doc = {"environment": environment(), "preset": args.preset, "results": results,
+           "algorithm_speeds": speeds,
+           "recommended": {"integrity": integrity, "change_detection": fastest}}
+    print(f"recommended: {integrity} (integrity), {fastest} (change detection)", file=sys.stderr)
+    text = json.dumps(doc, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for r, old in regressions:
+            print(f"REGRESSION {_key(r)}: {old} -> {r['mb_s']} MB/s", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
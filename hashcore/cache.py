@@ -0,0 +1,230 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .engine import BUFFER_SIZE, hash_file_multi
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".filehashchecker", "cache.sqlite")
+DEFAULT_MAX_ENTRIES = 2_000_000
+# Pending writes are committed in batches; one commit per file would dominate warm runs.
+COMMIT_EVERY = 1000
+# Stored as PRAGMA user_version; a cache from another version is dropped and rebuilt.
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    ctime_ns INTEGER NOT NULL,
+    algo TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    path TEXT NOT NULL,
+    used INTEGER NOT NULL,
+    PRIMARY KEY (dev, ino, size, mtime_ns, ctime_ns, algo)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS hashes_path ON hashes (path);
+CREATE INDEX IF NOT EXISTS hashes_used ON hashes (used);
+"""
+
+
+def file_key(st):
+    # mtime can be set back (touch -d, rsync -t, tar); ctime can't, every write moves it.
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns
+
+
+class HashCache:
+    def __init__(self, path=DEFAULT_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self._db.execute("DROP TABLE IF EXISTS hashes")
+            self._db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        self._db.executescript(SCHEMA)
+        self._count = self._db.execute("SELECT count(*) FROM hashes").fetchone()[0]
+
+    def get(self, st, algos):
+        # Returns {algo: digest} only if every requested algorithm is cached.
+        key = file_key(st)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT algo, digest FROM hashes WHERE dev=? AND ino=? AND size=? AND mtime_ns=? AND ctime_ns=?",
+                key).fetchall()
+            cached = dict(rows)
+            if all(a in cached for a in algos):
+                self.hits += 1
+                self._db.execute(
+                    "UPDATE hashes SET used=? WHERE dev=? AND ino=? AND size=? AND mtime_ns=? AND ctime_ns=?",
+                    (time.time_ns(), *key))
+                self._touch()
+                return {a: cached[a] for a in algos}
+            self.misses += 1
+            return None
+
+    def put(self, st, path, digests):
+        key = file_key(st)
+        now = time.time_ns()
+        with self._lock:
+            # Rows that are already there get replaced and must not count towards eviction.
+            stored = {algo for (algo,) in self._db.execute(
+                "SELECT algo FROM hashes WHERE dev=? AND ino=? AND size=? AND mtime_ns=? AND ctime_ns=?", key)}
+            self._db.executemany(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(*key, algo, digest, os.path.abspath(path), now) for algo, digest in digests.items()])
+            self._count += sum(algo not in stored for algo in digests)
+            self._touch()
+
+    def invalidate(self, path=None):
+        # Drops one file, everything below a folder, or (path=None) the whole cache.
+        with self._lock:
+            if path is None:
+                self._db.execute("DELETE FROM hashes")
+            else:
+                path = os.path.abspath(path)
+                prefix = path.rstrip(os.sep) + os.sep
+                self._db.execute(
+                    "DELETE FROM hashes WHERE path=? OR substr(path, 1, ?)=?",
+                    (path, len(prefix), prefix))
+            self._db.commit()
+            self._pending = 0
+            self._count = self._db.execute("SELECT count(*) FROM hashes").fetchone()[0]
+
+    def flush(self):
+        with self._lock:
+            self._evict()
+            self._db.commit()
+            self._pending = 0
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = 100.0 * self.hits / total if total else 0.0
+        return f"cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate)"
+
+    def _touch(self):
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self._evict()
+            self._db.commit()
+            self._pending = 0
+
+    def _evict(self):
+        if self._count <= self.max_entries:
+            return
+        # Least recently used entries go first, down to 90% so eviction doesn't run per insert.
+        keep = int(self.max_entries * 0.9)
+        self._db.execute(
+            "DELETE FROM hashes WHERE used <= (SELECT used FROM hashes ORDER BY used DESC LIMIT 1 OFFSET ?)",
+            (keep,))
+        self._count = self._db.execute("SELECT count(*) FROM hashes").fetchone()[0]
+
+
+class MemoryCache:
+    # LRU of recent results with the HashCache interface, optionally in front of one.
+    # Meant for long-running processes (the daemon), where a hit must not touch SQLite.
+    def __init__(self, max_entries=100_000, backing=None):
+        self.max_entries = max_entries
+        self.backing = backing
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, st, algos):
+        key = file_key(st)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and all(a in entry[1] for a in algos):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return {a: entry[1][a] for a in algos}
+        digests = self.backing.get(st, algos) if self.backing is not None else None
+        with self._lock:
+            if digests is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._store(key, None, digests)
+        return digests
+
+    def put(self, st, path, digests):
+        with self._lock:
+            self._store(file_key(st), os.path.abspath(path), digests)
+        if self.backing is not None:
+            self.backing.put(st, path, digests)
+
+    def _store(self, key, path, digests):
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry[1].update(digests)
+            self._entries.move_to_end(key)
+        else:
+            self._entries[key] = (path, dict(digests))
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                path = os.path.abspath(path)
+                prefix = path.rstrip(os.sep) + os.sep
+                for key in [k for k, (p, _) in self._entries.items()
+                            if p is None or p == path or p.startswith(prefix)]:
+                    del self._entries[key]
+        if self.backing is not None:
+            self.backing.invalidate(path)
+
+    def flush(self):
+        if self.backing is not None:
+            self.backing.flush()
+
+    def close(self):
+        if self.backing is not None:
+            self.backing.close()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = 100.0 * self.hits / total if total else 0.0
+        return f"memory cache: {len(self)} entries, {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate)"
+
+
+def open_cache(path=DEFAULT_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+    # The cache is an accelerator only: an unwritable home directory must not stop hashing.
+    try:
+        return HashCache(path, max_entries)
+    except (OSError, sqlite3.Error):
+        return None
+
+
+def cached_hash(path, algos, cache=None, buffer_size=BUFFER_SIZE, job=None):
+    # An unchanged file costs one stat() and one indexed lookup instead of a full read.
+    if cache is None:
+        return hash_file_multi(path, algos, buffer_size, job=job)
+    st = os.stat(path)
+    digests = cache.get(st, algos)
+    if digests is None:
+        digests = hash_file_multi(path, algos, buffer_size, job=job)
+        cache.put(st, path, digests)
+    elif job is not None:
+        job.add(st.st_size)
+    return digests
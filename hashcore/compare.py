@@ -0,0 +1,86 @@
+import os
+
+from .engine import BUFFER_SIZE
+
+# Granularity used to narrow a mismatching chunk down before the byte-by-byte scan.
+_NARROW = 4096
+
+
+class CompareResult:
+    def __init__(self, equal, offset=None, reason=""):
+        self.equal = equal
+        self.offset = offset
+        self.reason = reason
+
+    def __bool__(self):
+        return self.equal
+
+    def __repr__(self):
+        return f"CompareResult(equal={self.equal}, offset={self.offset}, reason={self.reason!r})"
+
+
+def first_difference(a, b):
+    # Index of the first differing byte of two equally long buffers, None if equal.
+    # memoryview == compares element by element (~250 MB/s); bytes and bytearray
+    # compare with memcmp, so slices are copied to bytes first.
+    for start in range(0, len(a), _NARROW):
+        block_a, block_b = bytes(a[start:start + _NARROW]), bytes(b[start:start + _NARROW])
+        if block_a != block_b:
+            for i, (x, y) in enumerate(zip(block_a, block_b)):
+                if x != y:
+                    return start + i
+    return None
+
+
+def _known_digests(st_a, st_b, cache, algo):
+    if cache is None or algo is None:
+        return None
+    da, db = cache.get(st_a, [algo]), cache.get(st_b, [algo])
+    if da is None or db is None:
+        return None
+    return da[algo], db[algo]
+
+
+def compare_files(path_a, path_b, buffer_size=BUFFER_SIZE, cache=None, algo=None, job=None):
+    # Cheapest evidence first: identity, size, cached digests, then a chunked byte
+    # comparison that stops at the first differing block.
+    st_a, st_b = os.stat(path_a), os.stat(path_b)
+    if (st_a.st_dev, st_a.st_ino) == (st_b.st_dev, st_b.st_ino):
+        return CompareResult(True, reason="same file")
+    if st_a.st_size != st_b.st_size:
+        return CompareResult(False, reason="size")
+    known = _known_digests(st_a, st_b, cache, algo)
+    if known is not None:
+        return CompareResult(known[0] == known[1], reason="cached hash")
+    buf_a, buf_b = bytearray(buffer_size), bytearray(buffer_size)
+    view_a, view_b = memoryview(buf_a), memoryview(buf_b)
+    offset = 0
+    with open(path_a, "rb", buffering=0) as fa, open(path_b, "rb", buffering=0) as fb:
+        while True:
+            n = fa.readinto(buf_a)
+            m = _read_exact(fb, view_b, n)
+            if n != m:
+                # File changed size underneath us.
+                return CompareResult(False, offset + min(n, m), "size")
+            if n == 0:
+                return CompareResult(True, reason="content")
+            # Equality first, at memcmp speed; the offset is only searched for on a mismatch.
+            if n == buffer_size:
+                equal = buf_a == buf_b
+            else:
+                equal = bytes(view_a[:n]) == bytes(view_b[:n])
+            if not equal:
+                return CompareResult(False, offset + first_difference(view_a[:n], view_b[:n]), "content")
+            offset += n
+            if job is not None:
+                job.add(2 * n)
+
+
+def _read_exact(f, view, n):
+    got = 0
+    while got < n:
+        k = f.readinto(view[got:n])
+        if not k:
+            break
+        got += k
+    return got
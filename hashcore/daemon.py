@@ -0,0 +1,555 @@
+import argparse
+import hmac
+import ipaddress
+import itertools
+import json
+import os
+import secrets
+import select
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from . import algorithms, jobs
+from .cache import MemoryCache, cached_hash, open_cache
+from .compare import CompareResult, compare_files
+from .manifest import VerifyReport, iter_manifest, manifest_algo, walk_files
+from .parallel import DEFAULT_WORKERS
+
+DEFAULT_SOCKET = os.path.join(os.path.expanduser("~"), ".filehashchecker", "daemon.sock")
+DEFAULT_PORT = 47011
+# Shared secret for TCP mode; the Unix socket is protected by its 0700 permissions instead.
+# A TCP client has to send it before any other request.
+DEFAULT_TOKEN = os.path.join(os.path.expanduser("~"), ".filehashchecker", "daemon.token")
+# Files of one request that are queued at a time; the rest wait until results go out, so a
+# huge request neither fills memory nor pushes other clients' work back.
+WINDOW = 256
+# Paths per hash request sent by Client.hash, so a tree walk never becomes one huge line.
+CLIENT_BATCH = 1000
+# While a reply waits for a worker, the connection is checked this often; a client that
+# hung up gets its running hashes cancelled instead of holding workers to the end.
+LIVENESS_INTERVAL = 0.5
+
+
+def default_address():
+    # A Unix socket where the platform has them, localhost TCP elsewhere (Windows).
+    if hasattr(socket, "AF_UNIX"):
+        return DEFAULT_SOCKET
+    return ("127.0.0.1", DEFAULT_PORT)
+
+
+def parse_address(text):
+    # "host:port" or a socket path.
+    if text is None:
+        return default_address()
+    host, sep, port = text.rpartition(":")
+    if sep and port.isdigit() and os.sep not in text:
+        return (host or "127.0.0.1", int(port))
+    return text
+
+
+def is_loopback(host):
+    # True if every address host resolves to is a loopback address.
+    try:
+        infos = socket.getaddrinfo(host.strip("[]"), None)
+    except OSError:
+        return False
+    return bool(infos) and all(ipaddress.ip_address(info[4][0].split("%")[0]).is_loopback for info in infos)
+
+
+def read_token(path=DEFAULT_TOKEN, create=False):
+    # The daemon token, created (readable by this user only) if create is set and there
+    # is none yet. None if there is no token file.
+    if create and not os.path.exists(path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass
+        else:
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_hex(32) + "\n")
+    try:
+        with open(path) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+class DaemonError(Exception):
+    pass
+
+
+class FileError(OSError):
+    # The daemon could not hash a file (missing, unreadable); the connection is fine.
+    pass
+
+
+class Scheduler:
+    # Shared worker pool. Every client has its own queue and the workers take one task from
+    # each client in turn, so a client hashing a million files doesn't stall one asking
+    # for a single file.
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self._queues = OrderedDict()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._work, daemon=True, name=f"hashd-{i}")
+                         for i in range(max(1, workers))]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, client, func, *args):
+        future = Future()
+        with self._cond:
+            self._queues.setdefault(client, deque()).append((future, func, args))
+            self._cond.notify()
+        return future
+
+    def forget(self, client):
+        # Drops the queued work of a client that went away. Running tasks stop through
+        # the client's Job (see _Connection).
+        with self._cond:
+            tasks = self._queues.pop(client, ())
+        for future, _, _ in tasks:
+            future.cancel()
+
+    def _next(self):
+        with self._cond:
+            while not self._queues and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return None
+            client, tasks = self._queues.popitem(last=False)
+            task = tasks.popleft()
+            if tasks:
+                # Back of the line: the other clients go first.
+                self._queues[client] = tasks
+            return task
+
+    def _work(self):
+        while (task := self._next()) is not None:
+            future, func, args = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class _Connection:
+    # One client: the Scheduler queue key, and the Job every task of the client runs under,
+    # cancelled when the client goes away.
+    def __init__(self, sock, authenticated):
+        self.job = jobs.Job()
+        self.authenticated = authenticated
+        self._sock = sock
+
+    def gone(self):
+        # True once the peer has closed; pipelined request data doesn't count.
+        try:
+            if not select.select([self._sock], [], [], 0)[0]:
+                return False
+            return not self._sock.recv(1, socket.MSG_PEEK)
+        except OSError:
+            return True
+
+    def wait(self, future):
+        while True:
+            try:
+                return future.result(timeout=LIVENESS_INTERVAL)
+            except FutureTimeout:
+                if self.gone():
+                    self.job.cancel()
+                    raise ConnectionError("client went away") from None
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    # One JSON object per line in both directions. Every reply line carries the request id;
+    # the last line of a reply has "done": true.
+    def handle(self):
+        server = self.server
+        client = _Connection(self.connection, server.token is None)
+        try:
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                request = None
+                try:
+                    request = json.loads(line)
+                    if not client.authenticated:
+                        # TCP: the first request must be {"op": "auth", "token": ...}.
+                        token = request.get("token") if request.get("op") == "auth" else None
+                        if not isinstance(token, str) or not hmac.compare_digest(token, server.token):
+                            self._send({"id": request.get("id"), "done": True, "error": "not authenticated"})
+                            return
+                        client.authenticated = True
+                        self._send({"id": request.get("id"), "done": True})
+                        continue
+                    op = getattr(server.service, "op_" + str(request.get("op")), None)
+                    if op is None:
+                        raise DaemonError(f"unknown op: {request.get('op')}")
+                    for reply in op(client, request):
+                        self._send({"id": request.get("id"), **reply})
+                    self._send({"id": request.get("id"), "done": True})
+                except (ValueError, KeyError, TypeError, OSError, DaemonError) as e:
+                    self._send({"id": request.get("id") if isinstance(request, dict) else None,
+                                "done": True, "error": str(e)})
+        except (ConnectionError, BrokenPipeError):
+            pass
+        finally:
+            server.scheduler.forget(client)
+            client.job.cancel()
+
+    def _send(self, obj):
+        self.wfile.write(json.dumps(obj, ensure_ascii=False).encode("utf-8", "surrogateescape") + b"\n")
+        self.wfile.flush()
+
+
+class Service:
+    # The operations. Each op_* yields reply objects; the handler frames and sends them.
+    # With tcp=True, compare doesn't report the offset of the first difference: compared
+    # against a file the client controls, it would give away a file's content byte by byte.
+    def __init__(self, scheduler, cache, tcp=False):
+        self.scheduler = scheduler
+        self.cache = cache
+        self.tcp = tcp
+        self.requests = 0
+
+    def _windowed(self, client, func, items):
+        # Yields (item, future) in input order with at most WINDOW futures queued.
+        pending = deque()
+        for item in items:
+            pending.append((item, self.scheduler.submit(client, func, *item)))
+            if len(pending) >= WINDOW:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+
+    def _hash(self, path, algos, job, use_cache=True):
+        return cached_hash(path, algos, self.cache if use_cache else None, job=job)
+
+    def _compare(self, first, second, job):
+        return compare_files(first, second, cache=self.cache, job=job)
+
+    def op_ping(self, client, request):
+        yield {"pong": True, "pid": os.getpid()}
+
+    def op_stats(self, client, request):
+        yield {"requests": self.requests, "cache": self.cache.stats()}
+
+    def op_hash(self, client, request):
+        self.requests += 1
+        algos = request.get("algos") or ["sha256"]
+        for a in algos:
+            algorithms.get(a)
+        use_cache = request.get("cache", True)
+        items = ((p, algos, client.job, use_cache) for p in request["paths"])
+        for (path, *_), future in self._windowed(client, self._hash, items):
+            try:
+                digests = client.wait(future)
+            except ConnectionError:
+                raise
+            except Exception as e:
+                yield {"path": path, "error": str(e)}
+                continue
+            yield {"path": path, "digests": digests}
+
+    def op_compare(self, client, request):
+        self.requests += 1
+        result = client.wait(self.scheduler.submit(client, self._compare, request["first"], request["second"],
+                                                   client.job))
+        yield {"equal": result.equal, "offset": None if self.tcp else result.offset, "reason": result.reason}
+
+    def op_verify(self, client, request):
+        # Same statuses as manifest.verify_manifest: OK, FAILED, MISSING, ERROR, NEW.
+        # Files are re-read unless the request asks for the cache ("cache": true), and
+        # "walk_options" filter the NEW scan like the walker options of a local verify.
+        self.requests += 1
+        manifest_path = request["manifest"]
+        root = request.get("root") or os.path.dirname(os.path.abspath(manifest_path))
+        algo = request.get("algo") or manifest_algo(manifest_path)
+        use_cache = request.get("cache", False)
+        walk_options = request.get("walk_options") or {}
+        listed = set()
+        entries = ((os.path.join(root, relpath), relpath, digest)
+                   for digest, relpath in iter_manifest(manifest_path, algo))
+
+        def check(path, relpath, digest):
+            return self._hash(path, [algo], client.job, use_cache)[algo] == digest
+
+        for (_, relpath, _), future in self._windowed(client, check, entries):
+            listed.add(os.path.normpath(relpath))
+            try:
+                status = "OK" if client.wait(future) else "FAILED"
+            except ConnectionError:
+                raise
+            except (FileNotFoundError, NotADirectoryError):
+                status = "MISSING"
+            except Exception:
+                status = "ERROR"
+            yield {"path": relpath, "status": status}
+            if status != "OK" and request.get("fail_fast"):
+                return
+        if request.get("detect_new", True):
+            manifest_abs = os.path.abspath(manifest_path)
+            for path in walk_files(root, **walk_options):
+                relpath = os.path.relpath(path, root)
+                if os.path.normpath(relpath) not in listed and os.path.abspath(path) != manifest_abs:
+                    yield {"path": relpath, "status": "NEW"}
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(address=None, workers=DEFAULT_WORKERS, cache_entries=100_000, persistent=True, ready=None,
+          allow_remote=False, token_path=DEFAULT_TOKEN):
+    # Runs until shutdown() is called on the returned server from another thread, or
+    # until interrupted. ready(server) is called once the socket accepts connections.
+    # TCP listens on loopback addresses only unless allow_remote is set, and always
+    # requires the token from token_path (created on first use).
+    address = address or default_address()
+    token = None
+    if isinstance(address, tuple):
+        if not allow_remote and not is_loopback(address[0]):
+            raise DaemonError(f"{address[0]} is not a loopback address; the daemon hashes any file this "
+                              "user can read, pass --allow-remote to listen there anyway")
+        token = read_token(token_path, create=True)
+        server = _TCPServer(address, _Handler)
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(address)), exist_ok=True)
+        if os.path.exists(address):
+            if ping(address):
+                raise DaemonError(f"a daemon is already listening on {address}")
+            os.unlink(address)
+        old = os.umask(0o077)
+        try:
+            server = _UnixServer(address, _Handler)
+        finally:
+            os.umask(old)
+    server.token = token
+    server.scheduler = Scheduler(workers)
+    server.service = Service(server.scheduler, MemoryCache(cache_entries, open_cache() if persistent else None),
+                             tcp=token is not None)
+    if ready is not None:
+        ready(server)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        server.scheduler.close()
+        server.service.cache.close()
+        if not isinstance(address, tuple):
+            try:
+                os.unlink(address)
+            except OSError:
+                pass
+    return server
+
+
+class Client:
+    # Thin client; one connection, one request at a time. Not thread-safe: give each
+    # thread its own Client. timeout applies to connecting and every later read until
+    # settimeout() changes it; connect() clears it once the daemon has answered a ping.
+    # Over TCP the token (default: the daemon's token file) is sent first.
+    def __init__(self, address=None, timeout=None, token=None):
+        address = address or default_address()
+        if isinstance(address, tuple):
+            self._sock = socket.create_connection(address, timeout)
+        else:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.settimeout(timeout)
+            try:
+                self._sock.connect(address)
+            except OSError:
+                self._sock.close()
+                raise
+        self._rfile = self._sock.makefile("rb")
+        self._next_id = 0
+        if isinstance(address, tuple):
+            try:
+                for _ in self.request("auth", token=token or read_token() or ""):
+                    pass
+            except BaseException:
+                self.close()
+                raise
+
+    def settimeout(self, timeout):
+        self._sock.settimeout(timeout)
+
+    def request(self, op, **fields):
+        # Yields the reply objects of one request; raises DaemonError on a failed request.
+        self._next_id += 1
+        line = json.dumps({"id": self._next_id, "op": op, **fields}, ensure_ascii=False)
+        self._sock.sendall(line.encode("utf-8", "surrogateescape") + b"\n")
+        done = False
+        try:
+            for raw in self._rfile:
+                reply = json.loads(raw)
+                if reply.get("done"):
+                    done = True
+                    if "error" in reply:
+                        raise DaemonError(reply["error"])
+                    return
+                yield reply
+            done = True
+            raise DaemonError("connection closed by daemon")
+        finally:
+            if not done:
+                # The caller stopped early; skip the rest so the next request starts clean.
+                for raw in self._rfile:
+                    if json.loads(raw).get("done"):
+                        break
+
+    def hash(self, paths, algos=("sha256",), fallback=None):
+        # Yields (path, digests, error) like parallel.hash_many; error is a message string.
+        # If the daemon goes away or fails a request and fallback is given, the paths it
+        # has not answered yet are handed to fallback(paths), e.g. a local hash_many.
+        paths = iter(paths)
+        batch = []
+        for path in paths:
+            batch.append(path)
+            if len(batch) >= CLIENT_BATCH:
+                yield from self._hash_batch(batch, algos, paths, fallback)
+                batch = []
+        if batch:
+            yield from self._hash_batch(batch, algos, paths, fallback)
+
+    def _hash_batch(self, paths, algos, rest=(), fallback=None):
+        # The daemon has its own working directory, so it gets absolute paths; the caller
+        # gets its own spelling back.
+        answered = 0
+        try:
+            replies = self.request("hash", paths=[os.path.abspath(p) for p in paths], algos=list(algos))
+            for path, reply in zip(paths, replies):
+                answered += 1
+                yield path, reply.get("digests"), reply.get("error")
+        except (OSError, ValueError, DaemonError):
+            if fallback is None:
+                raise
+            yield from fallback(itertools.chain(paths[answered:], rest))
+
+    def hash_file(self, path, algos=("sha256",)):
+        for _, digests, error in self.hash([path], algos):
+            if error is not None:
+                raise FileError(error)
+            return digests
+
+    def compare(self, first, second):
+        # offset is None over TCP (see Service).
+        for reply in self.request("compare", first=first, second=second):
+            return CompareResult(reply["equal"], reply["offset"], reply["reason"])
+
+    def verify(self, manifest, root=None, algo=None, fail_fast=False, detect_new=True, on_result=None,
+               walk_options=None, cache=False):
+        # Same result as manifest.verify_manifest, hashed by the daemon. cache=True lets
+        # unchanged files be answered from the daemon's cache instead of being re-read.
+        report = VerifyReport()
+        for reply in self.request("verify", manifest=os.path.abspath(manifest),
+                                  root=os.path.abspath(root) if root else None, algo=algo,
+                                  fail_fast=fail_fast, detect_new=detect_new,
+                                  walk_options=walk_options or {}, cache=cache):
+            relpath, status = reply["path"], reply["status"]
+            if status == "OK":
+                report.matched += 1
+            elif status == "FAILED":
+                report.mismatched.append(relpath)
+            elif status == "MISSING":
+                report.missing.append(relpath)
+            elif status == "NEW":
+                report.new.append(relpath)
+            else:
+                report.errors.append((relpath, "unreadable"))
+            if on_result is not None:
+                on_result(relpath, status)
+            if fail_fast and status not in ("OK", "NEW"):
+                report.stopped = True
+        return report
+
+    def ping(self):
+        return any(reply.get("pong") for reply in self.request("ping"))
+
+    def stats(self):
+        for reply in self.request("stats"):
+            return reply
+
+    def close(self):
+        self._rfile.close()
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def connect(address=None, timeout=5.0):
+    # A Client if a daemon answers, else None, so front-ends can fall back to local hashing.
+    try:
+        client = Client(address, timeout)
+    except (OSError, ValueError, DaemonError):
+        return None
+    try:
+        client.ping()
+    except (OSError, ValueError, DaemonError):
+        client.close()
+        return None
+    # The timeout was for finding the daemon; a large hash may take far longer than that.
+    client.settimeout(None)
+    return client
+
+
+def ping(address=None):
+    client = connect(address, timeout=1.0)
+    if client is None:
+        return False
+    client.close()
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m hashcore.daemon",
+                                     description="Local hashing service for the GUI and CLI.")
+    parser.add_argument("--address", help=f"socket path or host:port (default {DEFAULT_SOCKET} "
+                                          f"or 127.0.0.1:{DEFAULT_PORT} without Unix sockets)")
+    parser.add_argument("-j", "--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--cache-entries", type=int, default=100_000, help="results kept in memory")
+    parser.add_argument("--no-persistent-cache", action="store_true", help="don't use the SQLite hash cache")
+    parser.add_argument("--allow-remote", action="store_true",
+                        help="listen on a non-loopback TCP address (clients need the token file)")
+    parser.add_argument("--token-file", default=DEFAULT_TOKEN, help="TCP shared token (default %(default)s)")
+    args = parser.parse_args(argv)
+    address = parse_address(args.address)
+    # SIGTERM (systemd, kill) unwinds like Ctrl+C, so the socket file is removed.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        serve(address, args.workers, args.cache_entries, not args.no_persistent_cache,
+              ready=lambda server: print(f"listening on {address}", file=sys.stderr),
+              allow_remote=args.allow_remote, token_path=args.token_file)
+    except KeyboardInterrupt:
+        pass
+    except DaemonError as e:
+        print(e, file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from . import algorithms
+from .parallel import DEFAULT_WORKERS, hash_many
+from .walker import FileEntry
+
+# Bytes read from the head and from the tail of each candidate in the cheap stage.
+EDGE_BLOCK = 64 * 1024
+
+
+class DuplicateStats:
+    def __init__(self):
+        self.files = 0
+        self.bytes_total = 0
+        self.bytes_read = 0
+        self.hardlinks = 0
+
+    def summary(self):
+        saved = 100.0 * (1 - self.bytes_read / self.bytes_total) if self.bytes_total else 100.0
+        return (f"{self.files} files, {self.hardlinks} hard links, "
+                f"{self.bytes_read} of {self.bytes_total} bytes read ({saved:.1f}% avoided)")
+
+
+def edge_hash(path, size, algo="sha256", block=EDGE_BLOCK, job=None):
+    # Digest of the first and last block. Candidates are already grouped by size, so the
+    # size needn't be mixed in; a file no longer than two blocks is hashed whole, which
+    # makes the result its real digest.
+    h = algorithms.new(algo)
+    with open(path, "rb", buffering=0) as f:
+        if size <= 2 * block:
+            h.update(f.read())
+        else:
+            h.update(f.read(block))
+            f.seek(size - block)
+            h.update(f.read(block))
+    if job is not None:
+        job.add(min(size, 2 * block))
+    return h.hexdigest()
+
+
+def _safe_edge(path, size, algo, block, job):
+    try:
+        return edge_hash(path, size, algo, block, job)
+    except OSError:
+        return None
+
+
+def _group(items, key):
+    groups = defaultdict(list)
+    for item in items:
+        groups[key(item)].append(item)
+    return [g for g in groups.values() if len(g) > 1]
+
+
+def find_duplicates(paths, algo="sha256", workers=DEFAULT_WORKERS, cache=None, block=EDGE_BLOCK, job=None):
+    # Returns (groups, stats). Each group is (size, digest, [paths]). Files are grouped by
+    # size, then by an edge hash, and only survivors of both stages are hashed in full.
+    # Hard links are detected by inode: they are read once and reported as one group.
+    # paths may also be walker.FileEntry objects, which saves a stat per file.
+    stats = DuplicateStats()
+    by_inode = {}
+    for path in paths:
+        if job is not None:
+            job.check()
+        if isinstance(path, FileEntry):
+            path, size, key = path.path, path.size, (path.dev, path.ino)
+        else:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            size, key = st.st_size, (st.st_dev, st.st_ino)
+        stats.files += 1
+        stats.bytes_total += size
+        if key in by_inode:
+            by_inode[key][2].append(path)
+            stats.hardlinks += 1
+        else:
+            by_inode[key] = (path, size, [path])
+    # One entry per inode: (representative path, size, every path linked to it).
+    inodes = list(by_inode.values())
+    groups = []
+    candidates = []
+    for same_size in _group(inodes, lambda i: i[1]):
+        if same_size[0][1] == 0:
+            groups.append((0, algorithms.new(algo).hexdigest(), [p for i in same_size for p in i[2]]))
+        else:
+            candidates.extend(same_size)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        edges = list(pool.map(lambda i: _safe_edge(i[0], i[1], algo, block, job), candidates))
+    stats.bytes_read += sum(min(i[1], 2 * block) for i in candidates)
+    full = []
+    for same_edge in _group([(e, i) for e, i in zip(edges, candidates) if e], lambda c: (c[1][1], c[0])):
+        size = same_edge[0][1][1]
+        if size <= 2 * block:
+            groups.append((size, same_edge[0][0], [p for _, i in same_edge for p in i[2]]))
+        else:
+            full.extend(i for _, i in same_edge)
+
+    digests = {}
+    for path, result, error in hash_many([i[0] for i in full], [algo], workers, cache=cache, job=job):
+        if error is None:
+            digests[path] = result[algo]
+    stats.bytes_read += sum(i[1] for i in full)
+    for same in _group([i for i in full if i[0] in digests], lambda i: (i[1], digests[i[0]])):
+        groups.append((same[0][1], digests[same[0][0]], [p for i in same for p in i[2]]))
+
+    grouped = {p for g in groups for p in g[2]}
+    for path, size, links in inodes:
+        if len(links) > 1 and path not in grouped:
+            groups.append((size, None, list(links)))
+    return groups, stats
+
+
+def duplicate_rows(groups, algo="sha256"):
+    rows = []
+    for n, (size, digest, paths) in enumerate(groups, 1):
+        for path in paths:
+            rows.append({"group": n, "file": path, "size": size, algo: digest or ""})
+    return rows
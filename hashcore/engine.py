@@ -0,0 +1,241 @@
+import errno
+import mmap
+import os
+import queue
+import threading
+import time
+
+from . import algorithms
+
+ALGORITHMS = ("md5", "sha1", "sha256", "sha512")
+
+# 1 MiB keeps syscalls rare and hashlib releases the GIL for every update above 2 KiB.
+BUFFER_SIZE = 1024 * 1024
+# Files at least this large are mapped instead of read; below it readinto() is cheaper.
+# The kernel reads ahead of the page faults (MADV_SEQUENTIAL), so they need no prefetch.
+MMAP_THRESHOLD = 64 * 1024 * 1024
+# Files from this size up to MMAP_THRESHOLD (and larger ones with drop_behind, which
+# needs to evict range by range) get a reader thread that fills the next buffer while the
+# current one is hashed. Below it the thread start costs more than the overlap gains, and
+# with a single CPU there is nothing to overlap with.
+PREFETCH_THRESHOLD = 16 * 1024 * 1024 if (os.cpu_count() or 1) > 1 else None
+PREFETCH_DEPTH = 3
+# How far ahead of the reader the kernel is asked to start reading (POSIX_FADV_WILLNEED).
+READAHEAD = 8 * 1024 * 1024
+
+_FADVISE = hasattr(os, "posix_fadvise")
+_clock = time.perf_counter
+
+
+def _feed_mmap(m, size, hashers, buffer_size, job, timings):
+    # Reading happens as page faults inside update(), so timings only get "hash" here.
+    start = _clock()
+    with m:
+        if hasattr(m, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            m.madvise(mmap.MADV_SEQUENTIAL)
+        view = memoryview(m)
+        try:
+            for offset in range(0, size, buffer_size):
+                chunk = view[offset:offset + buffer_size]
+                for h in hashers:
+                    h.update(chunk)
+                chunk.release()
+                if job is not None:
+                    job.add(min(buffer_size, size - offset))
+        finally:
+            view.release()
+    if timings is not None:
+        timings.hash += _clock() - start
+
+
+def _feed_readinto(f, hashers, buffer_size, job, timings):
+    buf = bytearray(buffer_size)
+    view = memoryview(buf)
+    total = 0
+    while True:
+        if timings is None:
+            n = f.readinto(buf)
+        else:
+            t0 = _clock()
+            n = f.readinto(buf)
+            timings.read += _clock() - t0
+        if not n:
+            break
+        chunk = view[:n]
+        if timings is None:
+            for h in hashers:
+                h.update(chunk)
+        else:
+            t0 = _clock()
+            for h in hashers:
+                h.update(chunk)
+            timings.hash += _clock() - t0
+        total += n
+        if job is not None:
+            job.add(n)
+    return total
+
+
+def _feed_prefetch(f, hashers, buffers, job, drop_behind, timings, advise=True):
+    # A reader thread fills free buffers while this thread hashes full ones, so the disk
+    # and the CPU work at the same time. Both sides drop the GIL (read() and hashlib).
+    # timings.read is the time the hasher waited for data, not the reader's own time.
+    # advise=False for O_DIRECT files: WILLNEED would pull the file into the page cache
+    # next to the direct reads, reading every byte twice.
+    fd = f.fileno()
+    free, full = queue.Queue(), queue.Queue()
+    for buf in buffers:
+        free.put(buf)
+
+    def reader():
+        offset = advised = 0
+        try:
+            while (buf := free.get()) is not None:
+                if advise and _FADVISE and offset + len(buf) >= advised:
+                    # Each range is advised once; repeating it costs a page cache walk.
+                    advised = max(advised, offset + len(buf))
+                    os.posix_fadvise(fd, advised, READAHEAD, os.POSIX_FADV_WILLNEED)
+                    advised += READAHEAD
+                n = f.readinto(buf)
+                full.put((buf, offset, n, None))
+                if not n:
+                    return
+                offset += n
+        except Exception as e:
+            full.put((None, offset, 0, e))
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    total = 0
+    try:
+        while True:
+            t0 = _clock()
+            buf, offset, n, error = full.get()
+            t1 = _clock()
+            if error is not None:
+                raise error
+            if not n:
+                return total
+            chunk = memoryview(buf)[:n]
+            for h in hashers:
+                h.update(chunk)
+            chunk.release()
+            if timings is not None:
+                timings.read += t1 - t0
+                timings.hash += _clock() - t1
+            if drop_behind and _FADVISE:
+                # Hashed pages are of no further use; don't let a full scan evict hot data.
+                os.posix_fadvise(fd, offset, n, os.POSIX_FADV_DONTNEED)
+            free.put(buf)
+            total += n
+            if job is not None:
+                job.add(n)
+    finally:
+        free.put(None)
+        thread.join()
+
+
+def _open_direct(path, buffer_size):
+    # O_DIRECT file and page-aligned buffers (anonymous maps are), or None where the
+    # platform or file system can't do it (tmpfs and most network mounts say EINVAL).
+    if not hasattr(os, "O_DIRECT"):
+        return None
+    buffer_size = -(-buffer_size // mmap.PAGESIZE) * mmap.PAGESIZE
+    try:
+        f = open(os.open(path, os.O_RDONLY | os.O_DIRECT), "rb", buffering=0)
+    except OSError as e:
+        if e.errno == errno.EINVAL:
+            return None
+        raise
+    buffers = [mmap.mmap(-1, buffer_size) for _ in range(PREFETCH_DEPTH)]
+    try:
+        # Some file systems accept the flag and only fail the first read.
+        f.readinto(buffers[0])
+        f.seek(0)
+    except OSError as e:
+        f.close()
+        for buf in buffers:
+            buf.close()
+        if e.errno == errno.EINVAL:
+            return None
+        raise
+    return f, buffers
+
+
+def feed(path, hashers, buffer_size=BUFFER_SIZE, use_mmap=None, job=None, prefetch=None,
+         drop_behind=False, direct=False, timings=None):
+    # job (hashcore.jobs.Job) receives progress per chunk and raises Cancelled on cancel.
+    # drop_behind evicts the file from the page cache as it is hashed; direct bypasses the
+    # page cache with O_DIRECT where supported and silently falls back where not.
+    # timings (hashcore.metrics.FileTimings) gets seconds spent in open, stat, read and hash.
+    start = _clock()
+    if direct:
+        opened = _open_direct(path, buffer_size)
+        if opened is not None:
+            f, buffers = opened
+            if timings is not None:
+                timings.open += _clock() - start
+            try:
+                return _feed_prefetch(f, hashers, buffers, job, False, timings, advise=False)
+            finally:
+                f.close()
+                for buf in buffers:
+                    buf.close()
+    with open(path, "rb", buffering=0) as f:
+        fd = f.fileno()
+        opened = _clock()
+        size = os.fstat(fd).st_size
+        if timings is not None:
+            timings.open += opened - start
+            timings.stat += _clock() - opened
+        if _FADVISE and size:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        if use_mmap is None and prefetch is None:
+            use_mmap = size >= MMAP_THRESHOLD and not drop_behind
+        if prefetch is None:
+            prefetch = PREFETCH_THRESHOLD is not None and size >= PREFETCH_THRESHOLD and not use_mmap
+        try:
+            if prefetch:
+                return _feed_prefetch(f, hashers, [bytearray(buffer_size) for _ in range(PREFETCH_DEPTH)],
+                                      job, drop_behind, timings)
+            if use_mmap is None:
+                use_mmap = size >= MMAP_THRESHOLD
+            if use_mmap and size:
+                try:
+                    m = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError):
+                    # Not mappable (pipes, some network mounts): fall back to plain reads.
+                    m = None
+                if m is not None:
+                    _feed_mmap(m, size, hashers, buffer_size, job, timings)
+                    return size
+            return _feed_readinto(f, hashers, buffer_size, job, timings)
+        finally:
+            if drop_behind and _FADVISE and size:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def hash_file(path, algo="sha256", buffer_size=BUFFER_SIZE, use_mmap=None, job=None, prefetch=None,
+              drop_behind=False, direct=False):
+    h = algorithms.new(algo)
+    feed(path, [h], buffer_size, use_mmap, job, prefetch, drop_behind, direct)
+    return h.hexdigest()
+
+
+def hash_file_multi(path, algos=ALGORITHMS, buffer_size=BUFFER_SIZE, use_mmap=None, job=None, prefetch=None,
+                    drop_behind=False, direct=False, timings=None):
+    # One pass over the data, every chunk goes to each hasher while it is still hot in cache.
+    hashers = [algorithms.new(a) for a in algos]
+    feed(path, hashers, buffer_size, use_mmap, job, prefetch, drop_behind, direct, timings)
+    return {a: h.hexdigest() for a, h in zip(algos, hashers)}
+
+
+def parse_algos(value):
+    # "all" selects every standard algorithm, otherwise a comma separated list.
+    value = value.strip().lower()
+    if value == "all":
+        return list(ALGORITHMS)
+    algos = [a.strip() for a in value.split(",") if a.strip()]
+    for a in algos:
+        algorithms.get(a)
+    return algos
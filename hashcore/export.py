@@ -0,0 +1,123 @@
+import csv
+import gzip
+import io
+import json
+import time
+from datetime import datetime
+
+# Optional Parquet export (pip install pyarrow).
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+FORMATS = ("csv", "csv.gz", "jsonl", "jsonl.gz") + (("parquet",) if pyarrow is not None else ())
+# Rows are flushed to the OS at least this often, so a crash loses at most a second of work.
+FLUSH_ROWS = 500
+FLUSH_SECONDS = 1.0
+# Rows per Parquet row group. Unlike CSV a Parquet file is only readable once closed.
+PARQUET_ROWS = 65536
+
+
+def export_name(prefix, fmt="csv"):
+    return f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+
+
+def fieldnames_for(rows):
+    # Union of keys in first-seen order, "timestamp" kept last like in single-run exports.
+    names = {}
+    for row in rows:
+        for key in row:
+            names.setdefault(key, None)
+    names = [n for n in names if n != "timestamp"]
+    if any("timestamp" in row for row in rows):
+        names.append("timestamp")
+    return names
+
+
+def _cell(value):
+    return "" if value is None else str(value)
+
+
+class ResultWriter:
+    # Streams result dicts to CSV, JSON Lines or Parquet, CSV and JSON Lines optionally
+    # gzip-compressed, as they arrive. Format and compression follow the file name unless
+    # given explicitly. Parquet columns are all strings, like the CSV cells.
+    def __init__(self, path, fieldnames, fmt=None, compress=None):
+        if fmt is None:
+            if path.endswith(".parquet"):
+                fmt = "parquet"
+            else:
+                fmt = "jsonl" if ".jsonl" in path or ".ndjson" in path else "csv"
+        if compress is None:
+            compress = path.endswith(".gz")
+        if fmt not in ("csv", "jsonl", "parquet"):
+            raise ValueError(f"unknown export format: {fmt}")
+        if fmt == "parquet" and pyarrow is None:
+            raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+        self.path = path
+        self.fmt = fmt
+        self.fieldnames = list(fieldnames)
+        self.rows = 0
+        if fmt == "parquet":
+            schema = pyarrow.schema([(name, pyarrow.string()) for name in self.fieldnames])
+            self._parquet = pyarrow.parquet.ParquetWriter(path, schema)
+            self._batch = []
+            return
+        self._raw = open(path, "wb")
+        self._gz = gzip.GzipFile(fileobj=self._raw, mode="wb") if compress else None
+        self._file = io.TextIOWrapper(self._gz or self._raw, encoding="utf-8", newline="",
+                                      errors="surrogateescape")
+        self._last_flush = time.monotonic()
+        if fmt == "csv":
+            self._csv = csv.DictWriter(self._file, self.fieldnames, restval="", extrasaction="ignore")
+            self._csv.writeheader()
+
+    def write(self, row):
+        if self.fmt == "parquet":
+            self._batch.append(row)
+            self.rows += 1
+            if len(self._batch) >= PARQUET_ROWS:
+                self.flush()
+            return
+        if self.fmt == "csv":
+            self._csv.writerow(row)
+        else:
+            self._file.write(json.dumps({k: row.get(k, "") for k in self.fieldnames}, ensure_ascii=False) + "\n")
+        self.rows += 1
+        if self.rows % FLUSH_ROWS == 0 or time.monotonic() - self._last_flush >= FLUSH_SECONDS:
+            self.flush()
+
+    def write_many(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        if self.fmt == "parquet":
+            if self._batch:
+                columns = {name: [_cell(row.get(name)) for row in self._batch] for name in self.fieldnames}
+                self._parquet.write_table(pyarrow.table(columns, schema=self._parquet.schema))
+                self._batch = []
+            return
+        self._file.flush()
+        if self._gz is not None:
+            # Sync flush: everything written so far can be decompressed after a crash.
+            self._gz.flush()
+        self._raw.flush()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if self.fmt == "parquet":
+            self.flush()
+            self._parquet.close()
+            return
+        self._file.close()
+        if self._gz is not None:
+            self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
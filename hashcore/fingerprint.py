@@ -0,0 +1,153 @@
+import os
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from . import algorithms
+from .engine import hash_file_multi
+from .jobs import Cancelled
+from .parallel import DEFAULT_WORKERS, hash_many
+from .walker import FileEntry
+
+# Bytes per sample: one at the head, one at the tail and SAMPLES evenly spaced in between,
+# so a fingerprint reads at most (SAMPLES + 2) * SAMPLE_SIZE bytes whatever the file size.
+SAMPLE_SIZE = 64 * 1024
+SAMPLES = 8
+FINGERPRINT, FULL = "fingerprint", "full"
+# Fingerprints never equal a full digest of the same bytes, and differ per sampling layout.
+_TAG = b"filehash-fingerprint\0"
+_LAYOUT = struct.Struct("<QII")
+_RANDOM = hasattr(os, "posix_fadvise")
+
+
+def sample_offsets(size, samples=SAMPLES, block=SAMPLE_SIZE):
+    # None when the samples would cover (nearly) the whole file: it is hashed in full then.
+    if size <= (samples + 2) * block:
+        return None
+    last = size - block
+    return [0, *(last * (i + 1) // (samples + 1) for i in range(samples)), last]
+
+
+def fingerprint_file(path, algos, samples=SAMPLES, block=SAMPLE_SIZE, job=None):
+    # Returns ({algo: hex}, mode). The digest covers the size and the sampled blocks, read
+    # with pread so there is no seeking and no read-ahead of data that is never used.
+    size = os.stat(path).st_size
+    offsets = sample_offsets(size, samples, block)
+    if offsets is None:
+        return hash_file_multi(path, algos, job=job), FULL
+    hashers = [algorithms.new(a) for a in algos]
+    for h in hashers:
+        h.update(_TAG + _LAYOUT.pack(size, samples, block))
+    with open(path, "rb", buffering=0) as f:
+        fd = f.fileno()
+        if _RANDOM:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_RANDOM)
+        for offset in offsets:
+            data = os.pread(fd, block, offset)
+            for h in hashers:
+                h.update(data)
+    if job is not None:
+        # Progress counts the bytes covered, so the bar still tracks the tree size.
+        job.add(size)
+    return {a: h.hexdigest() for a, h in zip(algos, hashers)}, FINGERPRINT
+
+
+def _sample(path, algos, samples, block, job):
+    if isinstance(path, FileEntry):
+        path = path.path
+    try:
+        digests, mode = fingerprint_file(path, algos, samples, block, job)
+    except Cancelled:
+        raise
+    except Exception as e:
+        return path, None, e, None
+    if job is not None:
+        job.file_done()
+    return path, digests, None, mode
+
+
+def _sample_many(paths, algos, workers, samples, block, job):
+    # Ordered and bounded like hash_many; pread drops the GIL, so threads overlap the seeks.
+    workers = max(1, int(workers))
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for path in paths:
+            if job is not None:
+                job.check()
+            pending.append(pool.submit(_sample, path, algos, samples, block, job))
+            if len(pending) >= workers * 4:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _full(path, algos, cache, job):
+    # Full digest of a file whose fingerprint collided, as (digests, error). Progress
+    # already counted the file when it was sampled.
+    try:
+        if job is not None:
+            job.check()
+        st = os.stat(path)
+        digests = cache.get(st, algos) if cache is not None else None
+        if digests is None:
+            digests = hash_file_multi(path, algos)
+            if cache is not None:
+                cache.put(st, path, digests)
+    except Cancelled:
+        raise
+    except Exception as e:
+        return None, e
+    return digests, None
+
+
+def _settle(result, full, first):
+    # The final result of a sampled file: a colliding file keeps its fingerprint only if
+    # its bytes equal those of the first file with that fingerprint (which was already
+    # yielded with it); otherwise it gets its full digest.
+    if full is None:
+        return result
+    digests, error = full.result()
+    if error is not None:
+        return result[0], None, error, FULL
+    first_digests, first_error = first.result()
+    if first_error is None and first_digests == digests:
+        return result
+    return result[0], digests, None, FULL
+
+
+def fingerprint_many(paths, algos, workers=DEFAULT_WORKERS, samples=SAMPLES, block=SAMPLE_SIZE, strict=False,
+                     cache=None, job=None):
+    # Yields (path, digests, error, mode) in input order, mode "fingerprint" or "full".
+    # paths may be walker.FileEntry objects, as for hash_many.
+    # Results stream as files are sampled. A file whose fingerprint collides with an
+    # earlier one (same size and same samples: likely a duplicate, or an image that
+    # differs only between samples) is hashed in full, and so is that earlier file: the
+    # later file keeps the fingerprint if the bytes are the same, and is reported with its
+    # full digest if not, so equal digests still mean equal content. Only the colliding
+    # files wait for full hashes. strict=True hashes every file in full.
+    if strict:
+        for path, digests, error in hash_many(paths, algos, workers, cache=cache, job=job):
+            yield path, digests, error, FULL
+        return
+    workers = max(1, int(workers))
+    # fingerprint -> [first path, future of its full digest once another file collides]
+    firsts = {}
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for result in _sample_many(paths, algos, workers, samples, block, job):
+            full = first = None
+            if result[3] == FINGERPRINT:
+                key = result[1][algos[0]]
+                group = firsts.get(key)
+                if group is None:
+                    firsts[key] = [result[0], None]
+                else:
+                    if group[1] is None:
+                        group[1] = pool.submit(_full, group[0], algos, cache, job)
+                    first = group[1]
+                    full = pool.submit(_full, result[0], algos, cache, job)
+            pending.append((result, full, first))
+            while pending and (pending[0][1] is None or pending[0][1].done() or len(pending) >= workers * 4):
+                yield _settle(*pending.popleft())
+        while pending:
+            yield _settle(*pending.popleft())
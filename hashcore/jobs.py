@@ -0,0 +1,60 @@
+import threading
+import time
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Job:
+    # Shared progress/cancel state between a front-end and the hashing workers. Workers
+    # call add() per chunk and check() wherever stopping is safe.
+    def __init__(self, bytes_total=0):
+        self.bytes_done = 0
+        self.bytes_total = bytes_total
+        self.files_done = 0
+        self.total_known = bytes_total > 0
+        self.started = time.monotonic()
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    def add(self, n):
+        with self._lock:
+            self.bytes_done += n
+        if self._cancel.is_set():
+            raise Cancelled()
+
+    def add_total(self, n):
+        with self._lock:
+            self.bytes_total += n
+
+    def file_done(self):
+        with self._lock:
+            self.files_done += 1
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        if self._cancel.is_set():
+            raise Cancelled()
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.bytes_done / elapsed if elapsed > 0 else 0.0
+
+    def eta(self):
+        # Seconds left, or None while the total is still being measured.
+        rate = self.rate()
+        if not self.total_known or rate <= 0:
+            return None
+        return max(0.0, (self.bytes_total - self.bytes_done) / rate)
+
+    def fraction(self):
+        if not self.bytes_total:
+            return 0.0
+        return min(1.0, self.bytes_done / self.bytes_total)
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import time
+from collections import deque
+
+JOURNAL_DIR = os.path.join(os.path.expanduser("~"), ".filehashchecker", "journals")
+SUFFIX = ".journal"
+# The journal is fsync'ed at least this often, so a crash or power loss costs at most a few
+# seconds of hashing; syncing every line would make small files disk-latency bound.
+SYNC_SECONDS = 5.0
+SYNC_ROWS = 5000
+
+
+def journal_path(folder, directory=JOURNAL_DIR):
+    # One journal per tree root; the name doesn't depend on the working directory.
+    key = hashlib.sha1(os.fsencode(os.path.abspath(folder))).hexdigest()[:16]
+    return os.path.join(directory, key + SUFFIX)
+
+
+def _read(path):
+    # Returns (header, {path: (size, mtime_ns, row)}, end). A line cut short by a crash is
+    # ignored; end is the offset after the last complete line, where appending resumes.
+    header, done, end = None, {}, 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if header is None:
+                header = record
+            else:
+                entry_path, size, mtime_ns, row = record
+                done[entry_path] = (size, mtime_ns, row)
+            end += len(line)
+    if header is None:
+        raise ValueError(f"{path}: not a journal")
+    return header, done, end
+
+
+class Journal:
+    # Append-only record of the rows a folder run has exported, one JSON line per file after
+    # a header line with the run settings. Journal(path, header) starts a new run and
+    # Journal(path) reopens an interrupted one; merge() then replays what was done.
+    def __init__(self, path, header=None):
+        self.path = path
+        if header is None:
+            self.header, self.done, end = _read(path)
+            self._file = open(path, "r+b")
+            self._file.truncate(end)
+            self._file.seek(end)
+            self._synced = time.monotonic()
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.header, self.done = header, {}
+            self._file = open(path, "wb")
+            self._file.write(json.dumps(header).encode() + b"\n")
+            self.sync()
+        self._pending = 0
+
+    def __len__(self):
+        return len(self.done)
+
+    def take(self, entry):
+        # The exported row of a walker.FileEntry if it was done and hasn't changed since.
+        # Taken out of done, so a resumed run doesn't keep every row twice.
+        record = self.done.pop(entry.path, None)
+        if record is not None and record[:2] == (entry.size, entry.mtime_ns):
+            return record[2]
+        return None
+
+    def add(self, entry, row):
+        self._file.write(json.dumps([entry.path, entry.size, entry.mtime_ns, row]).encode() + b"\n")
+        self._pending += 1
+        if self._pending >= SYNC_ROWS or time.monotonic() - self._synced >= SYNC_SECONDS:
+            self.sync()
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._synced = time.monotonic()
+
+    def merge(self, entries, hash_results):
+        # Walks entries (FileEntry, in walk order) once and yields (entry, result, row) in
+        # the same order: row is the journaled row of a file done earlier, result what
+        # hash_results(entries) returned for the rest. hash_results must yield one result
+        # per entry, in order, as hash_many does.
+        order = deque()
+
+        def todo():
+            for entry in entries:
+                row = self.take(entry)
+                order.append((entry, row))
+                if row is None:
+                    yield entry
+
+        for result in hash_results(todo()):
+            entry, row = order.popleft()
+            while row is not None:
+                yield entry, None, row
+                entry, row = order.popleft()
+            yield entry, result, None
+        while order:
+            entry, row = order.popleft()
+            yield entry, None, row
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def discard(self):
+        # The run finished: nothing left to resume.
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
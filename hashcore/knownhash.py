@@ -0,0 +1,256 @@
+import heapq
+import mmap
+import os
+import re
+import struct
+import tempfile
+
+from . import algorithms
+
+SUFFIX = ".fhk"
+MAGIC = b"FHCKNOW1"
+# magic, algo, label, digest size, bloom hash count, record count, bloom bytes. 112 bytes,
+# a multiple of 8, so the fan-out table behind it can be read as aligned uint64s.
+HEADER = struct.Struct("<8s16s64sIIQQ")
+FANOUT = 1 << 16
+# Records sorted in memory per run of the external sort: 2M x (digest + object) ~ 150 MB.
+RUN_RECORDS = 2_000_000
+# Bloom filter bits per record; 10 bits and 7 hashes give about 1% false positives.
+BLOOM_BITS = 10
+BLOOM_HASHES = 7
+# Hash lookups per batch while a folder is hashed.
+LOOKUP_BATCH = 512
+
+_HEX = re.compile(rb"[0-9a-fA-F]+")
+
+
+def _digests(path, size):
+    # Every hex field of the right length in a text list: one digest per line, sha256sum
+    # output, or NSRL-style CSV where several hash columns share a line.
+    width = size * 2
+    with open(path, "rb") as f:
+        for line in f:
+            for field in _HEX.findall(line):
+                if len(field) == width:
+                    yield bytes.fromhex(field.decode())
+
+
+def _runs(records, size, tmpdir):
+    # First pass of the external sort: sorted runs of RUN_RECORDS on disk.
+    runs, batch = [], []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= RUN_RECORDS:
+            runs.append(_write_run(batch, tmpdir))
+            batch = []
+    if batch:
+        runs.append(_write_run(batch, tmpdir))
+    return runs
+
+
+def _write_run(batch, tmpdir):
+    batch.sort()
+    f = tempfile.TemporaryFile(dir=tmpdir)
+    f.write(b"".join(batch))
+    f.seek(0)
+    return f
+
+
+def _read_run(f, size):
+    while record := f.read(size):
+        yield record
+
+
+def _bloom_positions(digest, bits, k):
+    # Double hashing on slices of the digest itself; digests are already uniform.
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:16], "little") | 1
+    return [(h1 + i * h2) % bits for i in range(k)]
+
+
+def build(sources, out_path, algo="sha1", label="", bloom=True, tmpdir=None):
+    # Imports hex digest lists into a sorted, de-duplicated binary index and returns the
+    # record count. Memory stays bounded by RUN_RECORDS whatever the list size.
+    size = algorithms.get(algo).digest_size
+    if size < 16:
+        raise ValueError(f"{algo} digests are too short for an index")
+    records = (d for path in sources for d in _digests(path, size))
+    runs = _runs(records, size, tmpdir)
+    fanout = [0] * (FANOUT + 1)
+    tmp_out = out_path + ".part"
+    count = 0
+    try:
+        with open(tmp_out, "wb") as out:
+            out.write(bytes(HEADER.size + (FANOUT + 1) * 8))
+            last = None
+            for record in heapq.merge(*(_read_run(f, size) for f in runs)):
+                if record == last:
+                    continue
+                out.write(record)
+                fanout[int.from_bytes(record[:2], "big") + 1] += 1
+                last = record
+                count += 1
+            for i in range(FANOUT):
+                fanout[i + 1] += fanout[i]
+            bloom_bytes = 0
+            if bloom and count:
+                bits = max(64, count * BLOOM_BITS)
+                bloom_bytes = -(-bits // 64) * 8
+                bits = bloom_bytes * 8
+                filt = bytearray(bloom_bytes)
+                out.flush()
+                with open(tmp_out, "rb") as records_in:
+                    records_in.seek(HEADER.size + (FANOUT + 1) * 8)
+                    for record in _read_run(records_in, size):
+                        for pos in _bloom_positions(record, bits, BLOOM_HASHES):
+                            filt[pos >> 3] |= 1 << (pos & 7)
+                out.write(filt)
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, algo.encode(), label.encode()[:64], size,
+                                  BLOOM_HASHES if bloom_bytes else 0, count, bloom_bytes))
+            out.write(struct.pack(f"<{FANOUT + 1}Q", *fanout))
+        os.replace(tmp_out, out_path)
+    finally:
+        for f in runs:
+            f.close()
+        if os.path.exists(tmp_out):
+            os.remove(tmp_out)
+    return count
+
+
+class KnownHashSet:
+    # Memory-mapped index: nothing is loaded into Python objects, a lookup touches the
+    # fan-out entry, at most a few Bloom filter words and log2(bucket) records.
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path}: empty file")
+        try:
+            magic, algo, label, size, k, count, bloom_bytes = HEADER.unpack_from(self._map, 0)
+        except struct.error:
+            magic = None
+        if magic != MAGIC:
+            self._map.close()
+            self._file.close()
+            raise ValueError(f"{path}: not a known-hash index")
+        self.algo = algo.rstrip(b"\0").decode()
+        self.label = label.rstrip(b"\0").decode() or os.path.splitext(os.path.basename(path))[0]
+        self.digest_size = size
+        self.count = count
+        self._view = memoryview(self._map)
+        self._fanout = self._view[HEADER.size:HEADER.size + (FANOUT + 1) * 8].cast("Q")
+        self._records = HEADER.size + (FANOUT + 1) * 8
+        bloom_at = self._records + count * size
+        self._bloom = self._view[bloom_at:bloom_at + bloom_bytes] if bloom_bytes else None
+        self._bloom_bits = bloom_bytes * 8
+        self._bloom_k = k
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, digest):
+        if isinstance(digest, str):
+            try:
+                digest = bytes.fromhex(digest)
+            except ValueError:
+                return False
+        if len(digest) != self.digest_size:
+            return False
+        if self._bloom is not None:
+            bloom = self._bloom
+            for pos in _bloom_positions(digest, self._bloom_bits, self._bloom_k):
+                if not bloom[pos >> 3] & (1 << (pos & 7)):
+                    return False
+        prefix = int.from_bytes(digest[:2], "big")
+        lo, hi = self._fanout[prefix], self._fanout[prefix + 1]
+        m, size, base = self._map, self.digest_size, self._records
+        while lo < hi:
+            mid = (lo + hi) // 2
+            at = base + mid * size
+            record = m[at:at + size]
+            if record < digest:
+                lo = mid + 1
+            elif record > digest:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def contains_many(self, digests):
+        # Batched lookup; queries run in sorted order so neighbouring ones share pages.
+        # Returns a list of booleans in input order.
+        order = sorted(range(len(digests)), key=lambda i: digests[i])
+        found = [False] * len(digests)
+        for i in order:
+            found[i] = digests[i] in self
+        return found
+
+    def close(self):
+        if self._bloom is not None:
+            self._bloom.release()
+        self._fanout.release()
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class KnownHashes:
+    # Several indexes (e.g. NSRL known-good plus a known-bad list) queried together.
+    # annotate() turns hash_many results into rows with a "known" column in batches.
+    def __init__(self, paths=()):
+        self.sets = [KnownHashSet(p) for p in paths]
+
+    def add(self, path):
+        self.sets.append(KnownHashSet(path))
+
+    @property
+    def algos(self):
+        return sorted({s.algo for s in self.sets})
+
+    def labels_many(self, digests_list):
+        # digests_list: [{algo: hex}] -> ["label;label" or ""] for each entry.
+        labels = [[] for _ in digests_list]
+        for known in self.sets:
+            idx = [i for i, d in enumerate(digests_list) if d and known.algo in d]
+            if not idx:
+                continue
+            found = known.contains_many([digests_list[i][known.algo] for i in idx])
+            for i, hit in zip(idx, found):
+                if hit:
+                    labels[i].append(known.label)
+        return [";".join(names) for names in labels]
+
+    def annotate(self, results, batch=LOOKUP_BATCH):
+        # Wraps (path, digests, error, ...) results and yields them with the known labels
+        # appended: (path, digests, error, ..., known).
+        pending = []
+        for item in results:
+            pending.append(item)
+            if len(pending) >= batch:
+                yield from self._flush(pending)
+                pending = []
+        if pending:
+            yield from self._flush(pending)
+
+    def _flush(self, pending):
+        labels = self.labels_many([item[1] for item in pending])
+        for item, known in zip(pending, labels):
+            yield (*item, known)
+
+    def close(self):
+        for s in self.sets:
+            s.close()
+        self.sets = []
+
+    def __bool__(self):
+        return bool(self.sets)
@@ -0,0 +1,256 @@
+import os
+import re
+from collections import deque
+
+from . import algorithms, walker
+from .parallel import DEFAULT_WORKERS, hash_many
+
+# Suffix of the tags written for sampled fingerprints (see hashcore.fingerprint).
+FINGERPRINT_TAG = "-fingerprint"
+
+_TAGGED = re.compile(r"([A-Za-z0-9_-]+) \((.*)\) = ([0-9a-fA-F]+)")
+
+
+def _escape(name):
+    return name.replace("\\", "\\\\").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _unescape(name):
+    out, i = [], 0
+    while i < len(name):
+        c = name[i]
+        if c == "\\" and i + 1 < len(name):
+            nxt = name[i + 1]
+            out.append({"n": "\n", "r": "\r", "\\": "\\"}.get(nxt, nxt))
+            i += 2
+        else:
+            out.append(c)
+            i += 1
+    return "".join(out)
+
+
+def format_line(digest, relpath):
+    # Same layout as sha256sum/md5sum, including the leading backslash for escaped names.
+    name = relpath.replace(os.sep, "/")
+    escaped = _escape(name)
+    prefix = "\\" if escaped != name else ""
+    return f"{prefix}{digest}  {escaped}\n"
+
+
+def format_tagged_line(algo, digest, relpath):
+    # BSD/"--tag" layout: carries the algorithm, so one file can list several digests.
+    name = relpath.replace(os.sep, "/")
+    escaped = _escape(name)
+    prefix = "\\" if escaped != name else ""
+    return f"{prefix}{algo.upper()} ({escaped}) = {digest}\n"
+
+
+def parse_line(line):
+    # Returns (digest, name, algo) or None for blank and comment lines. algo comes from the
+    # tag of a BSD-style line ("sha256", "sha256-fingerprint") and is None for sha256sum
+    # style lines, which don't say.
+    line = line.rstrip("\n")
+    if line.endswith("\r"):
+        line = line[:-1]
+    if not line or line.startswith("#"):
+        return None
+    escaped = line.startswith("\\")
+    if escaped:
+        line = line[1:]
+    tagged = _TAGGED.fullmatch(line)
+    if tagged:
+        tag, name, digest = tagged.groups()
+        tag = tag.lower()
+        if not tag.endswith(FINGERPRINT_TAG):
+            # GNU writes SHA3-256 and BLAKE2b; the registry says sha3_256 and blake2b.
+            tag = tag.replace("-", "_")
+        if escaped:
+            name = _unescape(name)
+        return digest.lower(), name.replace("/", os.sep), tag
+    digest, sep, name = line.partition(" ")
+    if not sep or not name:
+        raise ValueError(f"malformed manifest line: {line!r}")
+    # "  name" is text mode, " *name" binary mode; both hash the same bytes.
+    if name[0] in " *":
+        name = name[1:]
+    if escaped:
+        name = _unescape(name)
+    return digest.lower(), name.replace("/", os.sep), None
+
+
+def iter_manifest(path, algo=None):
+    # Yields (digest, relpath). Tagged lines of other algorithms are skipped, so a
+    # multi-algorithm listing from "hash -a md5,sha256" verifies one algorithm at a time.
+    # Fingerprint lines can't be verified against anything and are an error.
+    with open(path, "r", encoding="utf-8", newline="\n", errors="surrogateescape") as f:
+        for lineno, line in enumerate(f, 1):
+            try:
+                entry = parse_line(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{lineno}: {e}") from None
+            if entry is None:
+                continue
+            digest, relpath, tag = entry
+            if tag is not None:
+                if tag.endswith(FINGERPRINT_TAG):
+                    raise ValueError(f"{path}:{lineno}: sampled fingerprints can't be verified, "
+                                     "hash without --fingerprint for a manifest")
+                if algo is not None and tag != algo:
+                    continue
+            if algo is not None and len(digest) != 2 * algorithms.get(algo).digest_size:
+                # Wrong algorithm for this manifest: every line would come out as FAILED.
+                raise ValueError(f"{path}:{lineno}: {len(digest)} hex digits, not a {algo} digest")
+            yield digest, relpath
+
+
+def _normalized(name):
+    return name.lower().replace("-", "").replace("_", "")
+
+
+def algo_from_name(manifest_path):
+    # The algorithm named by the file: SHA256SUMS, BLAKE2BSUMS, sha3-256sum.txt,
+    # files.sha512. None if the name doesn't say.
+    names = {_normalized(a): a for a in algorithms.REGISTRY}
+    base = os.path.basename(manifest_path)
+    stem, ext = os.path.splitext(base)
+    candidates = [_normalized(ext[1:]), _normalized(base), _normalized(stem)]
+    for candidate in candidates:
+        for suffix in ("sums", "sum", ""):
+            if candidate.endswith(suffix) and candidate[:len(candidate) - len(suffix)] in names:
+                return names[candidate[:len(candidate) - len(suffix)]]
+    return None
+
+
+def guess_algo(manifest_path):
+    # The tag of the first line, else the algorithm in the file name, else the digest
+    # length if only one algorithm has it (md5, sha1). None when that would be a guess:
+    # 64 hex digits are sha256, blake2s or sha3_256.
+    tag = digest = None
+    with open(manifest_path, "r", encoding="utf-8", newline="\n", errors="surrogateescape") as f:
+        for lineno, line in enumerate(f, 1):
+            try:
+                entry = parse_line(line)
+            except ValueError as e:
+                raise ValueError(f"{manifest_path}:{lineno}: {e}") from None
+            if entry is not None:
+                digest, _, tag = entry
+                break
+    if tag is not None:
+        if tag not in algorithms.REGISTRY and not tag.endswith(FINGERPRINT_TAG):
+            raise ValueError(f"{manifest_path}: unsupported hash type {tag}")
+        return tag
+    algo = algo_from_name(manifest_path)
+    if algo is not None or digest is None:
+        return algo
+    matches = [a.name for a in algorithms.REGISTRY.values() if 2 * a.digest_size == len(digest)]
+    return matches[0] if len(matches) == 1 else None
+
+
+def manifest_algo(manifest_path):
+    # guess_algo, but an error instead of None.
+    algo = guess_algo(manifest_path)
+    if algo is None:
+        raise ValueError(f"{manifest_path}: can't tell the algorithm from the file name or the digests, "
+                         "name it explicitly")
+    return algo
+
+
+def walk_files(folder, **options):
+    # Sorted walk, so manifests and exports come out byte-identical between runs. Every
+    # hard link gets its own manifest line unless the caller asks for dedupe_inodes.
+    options.setdefault("dedupe_inodes", False)
+    return walker.walk_paths(folder, **options)
+
+
+def write_manifest(folder, out_path, algo="sha256", workers=DEFAULT_WORKERS, cache=None, job=None,
+                   walk_options=None):
+    # Returns (files written, errors); unreadable files are reported, not listed.
+    # walk_options are passed to walker.Walker (exclude globs, size limits, ...).
+    out_abs = os.path.abspath(out_path)
+    # Entries rather than paths: hash_many and the cache reuse the stat of the walk.
+    options = {"dedupe_inodes": False, **(walk_options or {})}
+    paths = (e for e in walker.walk(folder, **options) if os.path.abspath(e.path) != out_abs)
+    written, errors = 0, []
+    with open(out_path, "w", encoding="utf-8", newline="\n", errors="surrogateescape") as out:
+        for path, digests, error in hash_many(paths, [algo], workers, cache=cache, job=job):
+            if error is not None:
+                errors.append((path, error))
+                continue
+            out.write(format_line(digests[algo], os.path.relpath(path, folder)))
+            written += 1
+    return written, errors
+
+
+class VerifyReport:
+    def __init__(self):
+        self.matched = 0
+        self.mismatched = []
+        self.missing = []
+        self.new = []
+        self.errors = []
+        self.stopped = False
+
+    @property
+    def ok(self):
+        return not (self.mismatched or self.missing or self.new or self.errors)
+
+    def summary(self):
+        text = (f"{self.matched} matched, {len(self.mismatched)} mismatched, "
+                f"{len(self.missing)} missing, {len(self.new)} new, {len(self.errors)} errors")
+        return text + (" (stopped at first failure)" if self.stopped else "")
+
+
+def verify_manifest(manifest_path, root=None, algo=None, workers=DEFAULT_WORKERS,
+                    fail_fast=False, detect_new=True, cache=None, job=None, on_result=None,
+                    walk_options=None, drop_behind=False, direct=False, metrics=None, profiler=None):
+    # The manifest is streamed: only in-flight entries and, with detect_new, one integer
+    # per listed path are held in memory, so multi-million line manifests are fine.
+    # on_result(relpath, status) is called per entry with OK, FAILED, MISSING, ERROR or NEW.
+    if root is None:
+        root = os.path.dirname(os.path.abspath(manifest_path))
+    if algo is None:
+        algo = manifest_algo(manifest_path)
+    report = VerifyReport()
+    listed = set()
+    expected = deque()
+
+    def paths():
+        for digest, relpath in iter_manifest(manifest_path, algo):
+            if detect_new:
+                listed.add(hash(os.path.normpath(relpath)))
+            expected.append((relpath, digest))
+            yield os.path.join(root, relpath)
+
+    results = hash_many(paths(), [algo], workers, cache=cache, job=job, drop_behind=drop_behind, direct=direct,
+                        metrics=metrics, profiler=profiler)
+    try:
+        for path, digests, error in results:
+            relpath, digest = expected.popleft()
+            if error is None and digests[algo] == digest:
+                report.matched += 1
+                status = "OK"
+            elif error is None:
+                report.mismatched.append(relpath)
+                status = "FAILED"
+            elif isinstance(error, (FileNotFoundError, NotADirectoryError)):
+                report.missing.append(relpath)
+                status = "MISSING"
+            else:
+                report.errors.append((relpath, error))
+                status = "ERROR"
+            if on_result is not None:
+                on_result(relpath, status)
+            if fail_fast and status != "OK":
+                report.stopped = True
+                return report
+    finally:
+        results.close()
+    if detect_new:
+        manifest_abs = os.path.abspath(manifest_path)
+        for path in walk_files(root, **(walk_options or {})):
+            relpath = os.path.relpath(path, root)
+            if hash(os.path.normpath(relpath)) not in listed and os.path.abspath(path) != manifest_abs:
+                report.new.append(relpath)
+                if on_result is not None:
+                    on_result(relpath, "NEW")
+    return report
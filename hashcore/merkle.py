@@ -0,0 +1,152 @@
+import os
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import algorithms
+from .parallel import DEFAULT_WORKERS
+
+BLOCK_SIZE = 4 * 1024 * 1024
+SIDECAR_SUFFIX = ".htree"
+MAGIC = b"FHCTREE1"
+# magic, algo name length, block size, file size, leaf count, digest size
+_HEADER = struct.Struct("<8sHQQQI")
+# Domain separation as in RFC 6962, so a leaf can never be mistaken for an inner node.
+_LEAF = b"\x00"
+_NODE = b"\x01"
+
+
+class TreeHash:
+    def __init__(self, algo, block_size, size, leaves):
+        self.algo = algo
+        self.block_size = block_size
+        self.size = size
+        self.leaves = leaves
+        self.root = merkle_root(algo, leaves)
+
+    def hexdigest(self):
+        return self.root.hex()
+
+    def block_range(self, index):
+        start = index * self.block_size
+        return start, min(start + self.block_size, self.size)
+
+
+def merkle_root(algo, leaves):
+    if not leaves:
+        return _digest(algo, _LEAF)
+    level = list(leaves)
+    while len(level) > 1:
+        nxt = [_digest(algo, _NODE, level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            # An odd node is promoted unchanged to the next level.
+            nxt.append(level[-1])
+        level = nxt
+    return level[0]
+
+
+def _digest(algo, *parts):
+    h = algorithms.new(algo)
+    for part in parts:
+        h.update(part)
+    return h.digest()
+
+
+class _BlockReader:
+    # os.pread/preadv on one shared descriptor: no seek, so any number of workers can read.
+    def __init__(self, fd, block_size, algo, job):
+        self.fd = fd
+        self.block_size = block_size
+        self.algo = algo
+        self.job = job
+        self._local = threading.local()
+
+    def __call__(self, index):
+        buf = getattr(self._local, "buf", None)
+        if buf is None:
+            buf = self._local.buf = bytearray(self.block_size)
+        offset = index * self.block_size
+        if hasattr(os, "preadv"):
+            n = os.preadv(self.fd, [buf], offset)
+            data = memoryview(buf)[:n]
+        else:
+            data = os.pread(self.fd, self.block_size, offset)
+        leaf = _digest(self.algo, _LEAF, data)
+        if self.job is not None:
+            self.job.add(len(data))
+        return leaf
+
+
+def _hash_blocks(path, indices, algo, block_size, workers, job):
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        reader = _BlockReader(fd, block_size, algo, job)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            return dict(zip(indices, pool.map(reader, indices)))
+    finally:
+        os.close(fd)
+
+
+def tree_hash(path, algo="sha256", block_size=BLOCK_SIZE, workers=DEFAULT_WORKERS, job=None):
+    # Hashes fixed-size blocks in parallel and combines them into a Merkle root, so one
+    # large file uses every core and damage can later be pinned to single blocks.
+    size = os.path.getsize(path)
+    count = (size + block_size - 1) // block_size
+    leaves = _hash_blocks(path, range(count), algo, block_size, workers, job)
+    return TreeHash(algo, block_size, size, [leaves[i] for i in range(count)])
+
+
+def sidecar_path(path):
+    return path + SIDECAR_SUFFIX
+
+
+def write_sidecar(tree, out_path):
+    name = tree.algo.encode("ascii")
+    digest_size = len(tree.root)
+    with open(out_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(name), tree.block_size, tree.size, len(tree.leaves), digest_size))
+        f.write(name)
+        f.writelines(tree.leaves)
+        f.write(tree.root)
+
+
+def read_sidecar(in_path):
+    with open(in_path, "rb") as f:
+        magic, name_len, block_size, size, count, digest_size = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{in_path}: not a tree hash sidecar")
+        algo = f.read(name_len).decode("ascii")
+        data = f.read(count * digest_size)
+        root = f.read(digest_size)
+    leaves = [data[i:i + digest_size] for i in range(0, len(data), digest_size)]
+    tree = TreeHash(algo, block_size, size, leaves)
+    if len(leaves) != count or tree.root != root:
+        raise ValueError(f"{in_path}: sidecar is truncated or corrupt")
+    return tree
+
+
+def verify_tree(path, tree, blocks=None, workers=DEFAULT_WORKERS, job=None):
+    # Returns (bad block indices, damaged byte ranges). With blocks given only those are
+    # re-read, e.g. to re-check the blocks an earlier run reported.
+    size = os.path.getsize(path)
+    count = len(tree.leaves)
+    if blocks is None:
+        blocks = range(count)
+    indices = [i for i in blocks if 0 <= i < count]
+    current = _hash_blocks(path, indices, tree.algo, tree.block_size, workers, job)
+    bad = [i for i in indices if current[i] != tree.leaves[i]]
+    ranges = merge_ranges(tree.block_range(i) for i in bad)
+    if size != tree.size:
+        # Bytes that were appended or cut off are damaged too.
+        ranges = merge_ranges(ranges + [(min(size, tree.size), max(size, tree.size))])
+    return bad, ranges
+
+
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
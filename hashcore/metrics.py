@@ -0,0 +1,212 @@
+import cProfile
+import heapq
+import json
+import os
+import pstats
+import threading
+import time
+
+PHASES = ("open", "stat", "read", "hash")
+SLOWEST = 10
+PROM_PREFIX = "filehash"
+
+
+class FileTimings:
+    # Filled in by engine.feed; plain attributes so the hot loop only does float adds.
+    __slots__ = ("open", "stat", "read", "hash", "worker")
+
+    def __init__(self):
+        self.open = self.stat = self.read = self.hash = 0.0
+        self.worker = None
+
+    @property
+    def total(self):
+        return self.open + self.stat + self.read + self.hash
+
+
+class Metrics:
+    # Collects FileTimings of one run. record() is only called from the thread that drives
+    # hash_many, so no locking is needed here.
+    def __init__(self, slowest=SLOWEST):
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.files = 0
+        self.bytes = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.workers = {}
+        self.started = time.monotonic()
+        self.finished = None
+        self._slowest_n = slowest
+        self._slowest = []
+
+    def record(self, path, size, timings, error=None):
+        if timings is None:
+            self.cache_hits += 1
+            return
+        for phase in PHASES:
+            self.phases[phase] += getattr(timings, phase)
+        if error is not None:
+            self.errors += 1
+            return
+        seconds = timings.total
+        self.files += 1
+        self.bytes += size
+        busy, files = self.workers.get(timings.worker, (0.0, 0))
+        self.workers[timings.worker] = (busy + seconds, files + 1)
+        item = (seconds, path, size)
+        if len(self._slowest) < self._slowest_n:
+            heapq.heappush(self._slowest, item)
+        elif item > self._slowest[0]:
+            heapq.heapreplace(self._slowest, item)
+
+    def finish(self):
+        self.finished = time.monotonic()
+
+    @property
+    def wall(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    def bound(self):
+        # Which resource the workers waited on most: "io" (read), "cpu" (hash) or
+        # "metadata" (open + fstat). "idle" when the workers were mostly not busy at all,
+        # which points at the producer side (tree walk, cache lookups, a slow consumer).
+        busy = sum(self.phases.values())
+        if not busy:
+            return "idle"
+        if self.workers and busy < 0.5 * self.wall * len(self.workers):
+            return "idle"
+        shares = {"io": self.phases["read"], "cpu": self.phases["hash"],
+                  "metadata": self.phases["open"] + self.phases["stat"]}
+        return max(shares, key=shares.get)
+
+    def summary(self):
+        wall = self.wall
+        busy = sum(self.phases.values())
+        return {
+            "wall_seconds": round(wall, 6),
+            "files": self.files,
+            "bytes": self.bytes,
+            "errors": self.errors,
+            "cache_hits": self.cache_hits,
+            "mb_s": round(self.bytes / wall / 1e6, 2) if wall else None,
+            "files_s": round(self.files / wall, 2) if wall else None,
+            "phase_seconds": {k: round(v, 6) for k, v in self.phases.items()},
+            "phase_share": {k: round(v / busy, 4) if busy else 0.0 for k, v in self.phases.items()},
+            "bound": self.bound(),
+            "workers": {
+                str(name): {"busy_seconds": round(b, 6), "files": n,
+                            "utilisation": round(b / wall, 4) if wall else None}
+                for name, (b, n) in sorted(self.workers.items(), key=lambda kv: str(kv[0]))
+            },
+            "slowest": [
+                {"path": path, "seconds": round(seconds, 6), "bytes": size,
+                 "mb_s": round(size / seconds / 1e6, 2) if seconds else None}
+                for seconds, path, size in sorted(self._slowest, reverse=True)
+            ],
+        }
+
+    def summary_line(self):
+        s = self.summary()
+        share = ", ".join(f"{k} {v:.0%}" for k, v in s["phase_share"].items())
+        return (f"{s['files']} files, {s['mb_s']} MB/s, {s['cache_hits']} cached; {share}; "
+                f"{s['bound']} bound")
+
+    def write_json(self, path):
+        _write_atomic(path, json.dumps(self.summary(), indent=2) + "\n")
+
+    def write_prometheus(self, path, labels=None):
+        # node_exporter textfile collector format; written atomically so a scrape never
+        # sees half a file.
+        _write_atomic(path, self.prometheus(labels))
+
+    def prometheus(self, labels=None):
+        s = self.summary()
+        base = dict(labels or {})
+        out = []
+
+        def metric(name, kind, help_text, samples):
+            out.append(f"# HELP {PROM_PREFIX}_{name} {help_text}")
+            out.append(f"# TYPE {PROM_PREFIX}_{name} {kind}")
+            for extra, value in samples:
+                out.append(f"{PROM_PREFIX}_{name}{_labels({**base, **extra})} {value}")
+
+        metric("files_total", "counter", "Files hashed.", [({}, s["files"])])
+        metric("bytes_total", "counter", "Bytes hashed.", [({}, s["bytes"])])
+        metric("errors_total", "counter", "Files that could not be hashed.", [({}, s["errors"])])
+        metric("cache_hits_total", "counter", "Files answered from the hash cache.", [({}, s["cache_hits"])])
+        metric("wall_seconds", "gauge", "Duration of the run.", [({}, s["wall_seconds"])])
+        metric("throughput_bytes_per_second", "gauge", "Bytes hashed per wall clock second.",
+               [({}, round(s["bytes"] / s["wall_seconds"], 2) if s["wall_seconds"] else 0)])
+        metric("phase_seconds_total", "counter", "Worker time per phase.",
+               [({"phase": k}, v) for k, v in s["phase_seconds"].items()])
+        metric("worker_utilisation", "gauge", "Busy share of the run per worker.",
+               [({"worker": k}, v["utilisation"]) for k, v in s["workers"].items()])
+        metric("bound", "gauge", "1 for the resource that limited the run.",
+               [({"resource": r}, int(r == s["bound"])) for r in ("io", "cpu", "metadata", "idle")])
+        return "\n".join(out) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def _write_atomic(path, text):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+class Profiler:
+    # cProfile only sees the thread it was enabled on, so each worker thread gets its own
+    # profile; dump() merges them into one pstats file (open with `python -m pstats`).
+    # Python 3.12+ allows one active profiler per interpreter: calls that overlap a
+    # profiled one run unprofiled and are counted in skipped, see warning().
+    def __init__(self):
+        self._local = threading.local()
+        self._profiles = []
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.skipped = 0
+
+    def run(self, func, *args, **kwargs):
+        profile = getattr(self._local, "profile", None)
+        if profile is None:
+            profile = self._local.profile = cProfile.Profile()
+        with self._lock:
+            self.calls += 1
+        try:
+            profile.enable()
+        except ValueError:
+            with self._lock:
+                self.skipped += 1
+            return func(*args, **kwargs)
+        if not getattr(self._local, "kept", False):
+            # Only profiles that ran: pstats can't load an empty one.
+            self._local.kept = True
+            with self._lock:
+                self._profiles.append(profile)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+
+    def warning(self):
+        # A line for the user if the profile is incomplete, else None.
+        if not self.skipped:
+            return None
+        return (f"profile covers {self.calls - self.skipped} of {self.calls} calls: this Python allows "
+                "one active profiler at a time, profile with -j 1 for complete numbers")
+
+    def dump(self, path):
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
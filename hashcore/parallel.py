@@ -0,0 +1,168 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .engine import BUFFER_SIZE, hash_file_multi
+from .jobs import Cancelled
+from .metrics import FileTimings
+from .walker import FileEntry
+
+DEFAULT_WORKERS = min(8, os.cpu_count() or 1)
+# Paths per task in process mode, so tiny files don't pay one IPC round trip each.
+PROCESS_BATCH = 64
+
+
+def _hash_batch(paths, algos, buffer_size, job=None, drop_behind=False, direct=False, timed=False):
+    # Returns [(digests, error, FileTimings or None)]; timings travel back with the result
+    # so process workers can be measured too.
+    out = []
+    worker = threading.current_thread().name if timed else None
+    if worker == "MainThread":
+        worker = f"pid {os.getpid()}"
+    for path in paths:
+        timings = None
+        if timed:
+            timings = FileTimings()
+            timings.worker = worker
+        try:
+            out.append((hash_file_multi(path, algos, buffer_size, job=job, drop_behind=drop_behind,
+                                        direct=direct, timings=timings), None, timings))
+        except Cancelled:
+            raise
+        except Exception as e:
+            out.append((None, e, timings))
+    return out
+
+
+def _lookup(paths, algos, cache, want_stat):
+    # Yields (path, stat, cached digests or None); stat errors are left to the worker.
+    # A walker.FileEntry brings the stat of the walk along.
+    for path in paths:
+        if isinstance(path, FileEntry):
+            st, path = path.stat, path.path
+            yield path, st, cache.get(st, algos) if cache is not None else None
+            continue
+        if cache is None and not want_stat:
+            yield path, None, None
+            continue
+        try:
+            st = os.stat(path)
+        except OSError:
+            yield path, None, None
+            continue
+        yield path, st, cache.get(st, algos) if cache is not None else None
+
+
+class _Link:
+    # Stands in for the digests of a hard link to an inode hashed earlier in the run.
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+
+def _links(items):
+    # Marks repeated inodes, so each hard-linked file is read once. Only files with more
+    # than one link are remembered.
+    seen = set()
+    for path, st, digests in items:
+        if digests is None and st is not None and st.st_nlink > 1:
+            key = (st.st_dev, st.st_ino)
+            if key in seen:
+                digests = _Link(key)
+            else:
+                seen.add(key)
+        yield path, st, digests
+
+
+def _batches(items, size):
+    # Cache hits and hard links are emitted as finished single-item batches so output
+    # order is kept.
+    batch = []
+    for path, st, digests in items:
+        if digests is not None:
+            if batch:
+                yield batch, None
+                batch = []
+            yield [(path, st)], digests
+            continue
+        batch.append((path, st))
+        if len(batch) >= size:
+            yield batch, None
+            batch = []
+    if batch:
+        yield batch, None
+
+
+def hash_many(paths, algos, workers=DEFAULT_WORKERS, mode="thread", max_in_flight=None,
+              buffer_size=BUFFER_SIZE, cache=None, job=None, drop_behind=False, direct=False,
+              metrics=None, profiler=None):
+    # Yields (path, digests, error) in input order. Threads suit large files since hashlib
+    # drops the GIL on big updates; "process" suits trees of many small files.
+    # paths may also be walker.FileEntry objects, which saves a stat per file.
+    # At most max_in_flight tasks are queued, so huge trees never pile up in memory.
+    # With a HashCache, lookups and stores happen on the calling thread only.
+    # A Job gets per-chunk progress in thread mode and per-file progress in process mode.
+    # drop_behind and direct keep a full scan out of the page cache (see engine.feed).
+    # metrics (hashcore.metrics.Metrics) gets per-file timings; a metrics.Profiler
+    # profiles the worker threads (thread mode only). A hard link to a file already
+    # hashed in this run gets that file's result without another read (needs a stat:
+    # a cache, a job, metrics or walker.FileEntry input).
+    workers = max(1, int(workers))
+    if max_in_flight is None:
+        max_in_flight = workers * 4
+    if mode == "process":
+        pool, batch_size = ProcessPoolExecutor(max_workers=workers), PROCESS_BATCH
+    elif mode == "thread":
+        pool, batch_size = ThreadPoolExecutor(max_workers=workers), 1
+    else:
+        raise ValueError(f"unknown executor mode: {mode}")
+    pending = deque()
+    # (st_dev, st_ino) -> (digests, error) of multiply linked files, for their other paths.
+    linked = {}
+    try:
+        worker_job = job if mode == "thread" else None
+        want_stat = job is not None or metrics is not None
+        for batch, digests in _batches(_links(_lookup(paths, algos, cache, want_stat)), batch_size):
+            if job is not None:
+                job.check()
+            if digests is not None:
+                pending.append((batch, [(digests, None, None)]))
+            else:
+                args = (_hash_batch, [path for path, _ in batch], algos, buffer_size, worker_job,
+                        drop_behind, direct, metrics is not None)
+                if profiler is not None and mode == "thread":
+                    args = (profiler.run, *args)
+                pending.append((batch, pool.submit(*args)))
+            if len(pending) >= max_in_flight:
+                yield from _drain(*pending.popleft(), cache, job, worker_job is None, metrics, linked)
+        while pending:
+            yield from _drain(*pending.popleft(), cache, job, worker_job is None, metrics, linked)
+    finally:
+        if job is not None and job.cancelled:
+            pool.shutdown(wait=False, cancel_futures=True)
+        else:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _drain(batch, result, cache, job, count_bytes, metrics=None, linked=None):
+    fresh = not isinstance(result, list)
+    if fresh:
+        result = result.result()
+    for (path, st), (digests, error, timings) in zip(batch, result):
+        if isinstance(digests, _Link):
+            # The first path of the inode was drained before this one (pending is FIFO).
+            digests, error = linked[digests.key]
+        elif linked is not None and st is not None and st.st_nlink > 1:
+            linked[(st.st_dev, st.st_ino)] = (digests, error)
+        if metrics is not None:
+            size = st.st_size if st is not None else 0
+            metrics.record(path, size, timings, error)
+        if fresh and cache is not None and st is not None and error is None:
+            cache.put(st, path, digests)
+        if job is not None:
+            if (count_bytes or not fresh) and st is not None:
+                job.add(st.st_size)
+            job.file_done()
+        yield path, digests, error
@@ -0,0 +1,199 @@
+import importlib.util
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, wait
+
+from .parallel import DEFAULT_WORKERS
+
+# plugins/ next to app.py, independent of the current working directory.
+PLUGIN_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "plugins")
+# Seconds PluginRunner.finish() waits, all batches still running together, before the
+# rest are reported as timed out.
+DEFAULT_TIMEOUT = 60.0
+BATCH_SIZE = 32
+
+
+class PluginTimeout(Exception):
+    pass
+
+
+class Plugin:
+    # Wraps a plugin module. Required: check(path) -> bool. Optional: check_many(paths)
+    # -> iterable of results in the same order, and EXTENSIONS (tuple of suffixes) or
+    # wants(path) -> bool to take part in folder runs.
+    def __init__(self, name, module):
+        self.name = name
+        self.module = module
+
+    @property
+    def folder_hook(self):
+        return hasattr(self.module, "wants") or hasattr(self.module, "EXTENSIONS")
+
+    def wants(self, path):
+        if hasattr(self.module, "wants"):
+            return bool(self.module.wants(path))
+        extensions = getattr(self.module, "EXTENSIONS", None)
+        return bool(extensions) and path.lower().endswith(tuple(extensions))
+
+    def check(self, path):
+        return self.module.check(path)
+
+    def check_many(self, paths):
+        if hasattr(self.module, "check_many"):
+            return list(self.module.check_many(paths))
+        return [self.module.check(p) for p in paths]
+
+
+class PluginRegistry:
+    def __init__(self, directory=PLUGIN_DIR):
+        self.directory = directory
+        self._plugins = {}
+        self._names = None
+
+    def names(self):
+        if self._names is None:
+            self.refresh()
+        return list(self._names)
+
+    def refresh(self):
+        # Rescans the directory; modules that are already loaded stay cached.
+        if os.path.isdir(self.directory):
+            self._names = sorted(f for f in os.listdir(self.directory) if f.endswith(".py"))
+        else:
+            self._names = []
+
+    def get(self, name):
+        plugin = self._plugins.get(name)
+        if plugin is None:
+            path = os.path.join(self.directory, name)
+            spec = importlib.util.spec_from_file_location(f"hashcore_plugin_{name[:-3]}", path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            plugin = self._plugins[name] = Plugin(name, module)
+        return plugin
+
+    def folder_hooks(self):
+        hooks = []
+        for name in self.names():
+            try:
+                plugin = self.get(name)
+            except Exception:
+                continue
+            if plugin.folder_hook:
+                hooks.append(plugin)
+        return hooks
+
+    def run(self, name, paths, workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT):
+        runner = PluginRunner([self.get(name)], workers, timeout, match_all=True)
+        for path in paths:
+            runner.feed(path)
+        return list(runner.finish())
+
+
+class _DaemonPool:
+    # Minimal executor on daemon threads. ThreadPoolExecutor workers are joined at
+    # interpreter exit, so one hung plugin would keep the application from closing;
+    # these are abandoned instead.
+    def __init__(self, workers):
+        self._tasks = queue.SimpleQueue()
+        self._threads = [threading.Thread(target=self._work, name=f"plugin-{i}", daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn, *args):
+        future = Future()
+        self._tasks.put((future, fn, args))
+        return future
+
+    def _work(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            future, fn, args = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def shutdown(self):
+        # Queued tasks are cancelled, running ones finish (or hang) on their own.
+        while True:
+            try:
+                task = self._tasks.get_nowait()
+            except queue.Empty:
+                break
+            if task is not None:
+                task[0].cancel()
+        for _ in self._threads:
+            self._tasks.put(None)
+
+
+class PluginRunner:
+    # Feeds paths to plugins in batches on a worker pool while a folder walk goes on.
+    # finish() yields (plugin name, path, result or exception) in submission order.
+    def __init__(self, plugins, workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT, match_all=False):
+        self.plugins = plugins
+        self.timeout = timeout
+        self.match_all = match_all
+        self._pool = _DaemonPool(max(1, workers))
+        self._closed = False
+        self._batches = {p.name: [] for p in plugins}
+        self._futures = deque()
+
+    def feed(self, path):
+        for plugin in self.plugins:
+            if self.match_all or plugin.wants(path):
+                batch = self._batches[plugin.name]
+                batch.append(path)
+                if len(batch) >= BATCH_SIZE:
+                    self._submit(plugin)
+
+    def _submit(self, plugin):
+        batch = self._batches[plugin.name]
+        if batch:
+            self._futures.append((plugin.name, batch, self._pool.submit(plugin.check_many, batch)))
+            self._batches[plugin.name] = []
+
+    def ready(self):
+        # Results of batches that already finished, without blocking the walk.
+        while self._futures and self._futures[0][2].done():
+            yield from self._collect(*self._futures.popleft())
+
+    def finish(self):
+        # One deadline for everything still outstanding, not timeout per batch.
+        for plugin in self.plugins:
+            self._submit(plugin)
+        deadline = time.monotonic() + self.timeout
+        try:
+            while self._futures:
+                future = self._futures[0][2]
+                wait([future], timeout=max(0.0, deadline - time.monotonic()))
+                yield from self._collect(*self._futures.popleft())
+        finally:
+            self.close()
+
+    def close(self):
+        # A plugin that ran into its time limit can't be killed, only abandoned.
+        if not self._closed:
+            self._closed = True
+            self._pool.shutdown()
+
+    def _collect(self, name, batch, future):
+        if not future.done():
+            results = [PluginTimeout(f"{name}: no result within {self.timeout:.0f} s")] * len(batch)
+        else:
+            try:
+                results = future.result()
+            except Exception as e:
+                results = [e] * len(batch)
+        for path, result in zip(batch, results):
+            yield name, path, result
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+
+# Lines kept in memory for display; everything else lives only in the spill file.
+DEFAULT_MAXLEN = 5000
+
+
+class SessionLog:
+    # Thread-safe session log. Every line is appended to a spill file on disk, lines not
+    # yet shown wait in a bounded queue, and a front-end pulls them in batches with
+    # drain() at its own pace. Memory stays bounded however many lines are written.
+    def __init__(self, path=None, maxlen=DEFAULT_MAXLEN, keep=False):
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="hash_session_", suffix=".log")
+            os.close(fd)
+        self.path = path
+        self.keep = keep
+        self._pending = deque()
+        self._maxlen = maxlen
+        self._skipped = 0
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", errors="replace")
+
+    def write(self, msg):
+        line = f"[{time.strftime('%H:%M:%S')}] {msg}"
+        with self._lock:
+            self._file.write(line + "\n")
+            if len(self._pending) >= self._maxlen:
+                self._pending.popleft()
+                self._skipped += 1
+            self._pending.append(line)
+        return line
+
+    def drain(self, limit):
+        # Returns (lines, skipped): at most limit new lines, plus how many lines were
+        # written too fast to show and exist only in the spill file.
+        with self._lock:
+            n = min(limit, len(self._pending))
+            out = [self._pending.popleft() for _ in range(n)]
+            if len(self._pending) > limit:
+                # Too far behind: keep the newest lines, the rest are already on disk.
+                drop = len(self._pending) - limit
+                for _ in range(drop):
+                    self._pending.popleft()
+                self._skipped += drop
+            skipped, self._skipped = self._skipped, 0
+            return out, skipped
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def __iter__(self):
+        # Streams the complete log back from disk.
+        self.flush()
+        with open(self.path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                yield line.rstrip("\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+        if not self.keep:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
@@ -0,0 +1,219 @@
+import array
+import os
+import sys
+import threading
+import time
+
+from . import algorithms
+from .export import ResultWriter
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# The path index is an open-addressing table of row numbers + 1 (0 = empty slot), grown
+# before it is two thirds full so probe chains stay short.
+INITIAL_SLOTS = 1024
+_SEPARATORS = os.sep + (os.altsep or "")
+
+
+def _split(path):
+    # Exact split after the last separator, so directory + name gives the path back as is.
+    i = max(path.rfind(sep) for sep in _SEPARATORS)
+    return path[:i + 1], path[i + 1:].encode("utf-8", "surrogatepass")
+
+
+class ResultStore:
+    # Column store for session results, instead of one dict per file. Per file it keeps:
+    #   directory id       4 bytes   array "I"; each distinct directory string is kept once
+    #   name end offset    4 bytes   array "I"; names are packed as UTF-8 in one bytearray
+    #   name               len(name) bytes
+    #   digests            digest size + 1 presence byte per algorithm (sha256: 33 bytes)
+    #   timestamp          4 bytes   array "I", Unix seconds
+    #   extra columns      4 bytes each, ids into a list of distinct values ("mode", "known")
+    #   path index         6-12 bytes
+    # A sha256 result with a 20 character file name comes to about 75 bytes, where a row
+    # dict with its strings takes 600-700. nbytes() reports the actual figure.
+    # add() and reads may run on different threads; a lock keeps rows consistent.
+    __slots__ = ("_dirs", "_dir_ids", "_dir_index", "_names", "_name_ends", "_digests", "_extras",
+                 "_timestamps", "_slots", "_count", "_lock")
+
+    def __init__(self):
+        self._dirs = []
+        self._dir_index = {}
+        self._dir_ids = array.array("I")
+        self._names = bytearray()
+        self._name_ends = array.array("I")
+        # algo -> (digest size, bytearray of digests, bytearray of presence flags)
+        self._digests = {}
+        # column -> (array of value ids, [None, value, ...], {value: id})
+        self._extras = {}
+        self._timestamps = array.array("I")
+        self._slots = array.array("i", bytes(4 * INITIAL_SLOTS))
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def algos(self):
+        return list(self._digests)
+
+    @property
+    def fieldnames(self):
+        return ["file", *self._digests, *self._extras, "timestamp"]
+
+    def add(self, path, digests, timestamp=None, **extra):
+        # Appends one result and returns its row number; a path added again is found at
+        # its newest row. digests is {algo: hex}, extra values are short strings.
+        with self._lock:
+            row = self._count
+            directory, name = _split(path)
+            dir_id = self._dir_index.get(directory)
+            if dir_id is None:
+                dir_id = self._dir_index[directory] = len(self._dirs)
+                self._dirs.append(directory)
+            self._dir_ids.append(dir_id)
+            self._names += name
+            end = len(self._names)
+            if end > 0xFFFFFFFF and self._name_ends.typecode == "I":
+                self._name_ends = array.array("Q", self._name_ends)
+            self._name_ends.append(end)
+            for algo, hex_digest in digests.items():
+                column = self._digests.get(algo)
+                if column is None:
+                    size = algorithms.get(algo).digest_size
+                    column = self._digests[algo] = (size, bytearray(size * row), bytearray(row))
+                size, data, present = column
+                digest = bytes.fromhex(hex_digest)
+                if len(digest) != size:
+                    raise ValueError(f"{path}: {algo} digest of {len(digest)} bytes, expected {size}")
+                data += digest
+                present.append(1)
+            for algo, (size, data, present) in self._digests.items():
+                if len(present) == row:
+                    data += bytes(size)
+                    present.append(0)
+            for key, value in extra.items():
+                column = self._extras.get(key)
+                if column is None:
+                    column = self._extras[key] = (array.array("I", bytes(4 * row)), [None], {None: 0})
+                ids, values, index = column
+                value_id = index.get(value)
+                if value_id is None:
+                    value_id = index[value] = len(values)
+                    values.append(value)
+                ids.append(value_id)
+            for key, (ids, _, _) in self._extras.items():
+                if len(ids) == row:
+                    ids.append(0)
+            self._timestamps.append(int(time.time() if timestamp is None else timestamp))
+            self._count = row + 1
+            if self._count * 3 > len(self._slots) * 2:
+                self._rehash(len(self._slots) * 2)
+            else:
+                self._insert(hash(path), dir_id, name, row)
+            return row
+
+    def add_row(self, row):
+        # Takes an export-style dict back: "file", digest columns, "timestamp" (as
+        # formatted by TIMESTAMP_FORMAT) and any other keys as extra columns.
+        digests, extra = {}, {}
+        for key, value in row.items():
+            if key in ("file", "timestamp"):
+                continue
+            if key in algorithms.REGISTRY:
+                if value:
+                    digests[key] = value
+            else:
+                extra[key] = value
+        timestamp = row.get("timestamp")
+        if timestamp:
+            timestamp = time.mktime(time.strptime(timestamp, TIMESTAMP_FORMAT))
+        return self.add(row["file"], digests, timestamp or None, **extra)
+
+    def _insert(self, path_hash, dir_id, name, row):
+        slots = self._slots
+        mask = len(slots) - 1
+        i = path_hash & mask
+        while slots[i]:
+            other = slots[i] - 1
+            if self._dir_ids[other] == dir_id and self._name(other) == name:
+                break
+            i = (i + 1) & mask
+        slots[i] = row + 1
+
+    def _rehash(self, size):
+        self._slots = array.array("i", bytes(4 * size))
+        for row in range(self._count):
+            name = self._name(row)
+            dir_id = self._dir_ids[row]
+            path = self._dirs[dir_id] + name.decode("utf-8", "surrogatepass")
+            self._insert(hash(path), dir_id, name, row)
+
+    def _name(self, row):
+        start = self._name_ends[row - 1] if row else 0
+        return bytes(self._names[start:self._name_ends[row]])
+
+    def path(self, row):
+        with self._lock:
+            return self._dirs[self._dir_ids[row]] + self._name(row).decode("utf-8", "surrogatepass")
+
+    def find(self, path):
+        # Row number of the newest result for path, or None.
+        directory, name = _split(path)
+        with self._lock:
+            dir_id = self._dir_index.get(directory)
+            if dir_id is None:
+                return None
+            slots = self._slots
+            mask = len(slots) - 1
+            i = hash(path) & mask
+            while slots[i]:
+                row = slots[i] - 1
+                if self._dir_ids[row] == dir_id and self._name(row) == name:
+                    return row
+                i = (i + 1) & mask
+            return None
+
+    def __contains__(self, path):
+        return self.find(path) is not None
+
+    def get(self, path):
+        row = self.find(path)
+        return None if row is None else self.row(row)
+
+    def row(self, row):
+        # The result as an export row dict, the same shape ResultWriter takes.
+        with self._lock:
+            out = {"file": self._dirs[self._dir_ids[row]] + self._name(row).decode("utf-8", "surrogatepass")}
+            for algo, (size, data, present) in self._digests.items():
+                if present[row]:
+                    out[algo] = data[row * size:(row + 1) * size].hex()
+            for key, (ids, values, _) in self._extras.items():
+                value = values[ids[row]]
+                if value is not None:
+                    out[key] = value
+            out["timestamp"] = time.strftime(TIMESTAMP_FORMAT, time.localtime(self._timestamps[row]))
+            return out
+
+    def __iter__(self):
+        for row in range(self._count):
+            yield self.row(row)
+
+    def export(self, path, fmt=None):
+        # Streams every row to CSV, JSON Lines or Parquet (see export.ResultWriter).
+        with ResultWriter(path, self.fieldnames, fmt) as writer:
+            for row in self:
+                writer.write(row)
+        return writer.rows
+
+    def nbytes(self):
+        # Bytes held by the columns and the index, directory strings included.
+        with self._lock:
+            total = sum(sys.getsizeof(d) for d in self._dirs) + len(self._names)
+            for arr in (self._dir_ids, self._name_ends, self._timestamps, self._slots):
+                total += arr.itemsize * len(arr)
+            for _, data, present in self._digests.values():
+                total += len(data) + len(present)
+            for ids, values, _ in self._extras.values():
+                total += ids.itemsize * len(ids) + sum(sys.getsizeof(v) for v in values)
+            return total
@@ -0,0 +1,176 @@
+import fnmatch
+import operator
+import os
+import stat
+
+_NAME = operator.attrgetter("name")
+SYMLINK_POLICIES = ("skip", "files", "follow")
+# Offered as a default by the front-ends; the walker itself excludes nothing unless asked.
+JUNK_PATTERNS = (".git", ".hg", ".svn", "__pycache__", "node_modules", ".tox", ".venv", "build", "dist")
+
+
+class FileEntry:
+    __slots__ = ("path", "size", "mtime_ns", "dev", "ino", "stat")
+
+    def __init__(self, path, st):
+        self.path = path
+        self.size = st.st_size
+        self.mtime_ns = st.st_mtime_ns
+        self.dev = st.st_dev
+        self.ino = st.st_ino
+        # The full stat, so hash_many and the cache don't need to stat the file again.
+        self.stat = st
+
+
+class WalkStats:
+    def __init__(self):
+        self.dirs = 0
+        self.files = 0
+        self.excluded = 0
+        self.hardlinks = 0
+        self.errors = []
+
+
+def split_patterns(text):
+    # "a;b, c" -> ["a", "b", "c"], as typed into the GUI.
+    return [p.strip() for p in text.replace(",", ";").split(";") if p.strip()]
+
+
+class Walker:
+    # os.scandir based tree walk. File metadata comes from the DirEntry (free on Windows,
+    # one cached stat on POSIX), entries are visited in sorted order like a sorted os.walk,
+    # and every path of a hard-linked file is yielded unless dedupe_inodes is set;
+    # stats.hardlinks counts the repeats either way (hash_many reads each inode once).
+    def __init__(self, root, include=None, exclude=None, min_size=None, max_size=None,
+                 symlinks="files", max_depth=None, same_fs=False, dedupe_inodes=False):
+        if symlinks not in SYMLINK_POLICIES:
+            raise ValueError(f"symlink policy must be one of {SYMLINK_POLICIES}")
+        self.root = root
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.min_size = min_size
+        self.max_size = max_size
+        self.symlinks = symlinks
+        self.max_depth = max_depth
+        self.same_fs = same_fs
+        self.dedupe_inodes = dedupe_inodes
+        self.stats = WalkStats()
+
+    def _excluded(self, name, relpath):
+        return any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(relpath, p) for p in self.exclude)
+
+    def _included(self, name, relpath):
+        return not self.include or any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(relpath, p)
+                                       for p in self.include)
+
+    def excluded_dir(self, relpath):
+        # For callers that learn about directories themselves (watch mode).
+        return bool(self.exclude) and self._excluded(os.path.basename(relpath), relpath)
+
+    def wanted(self, relpath):
+        # Would a file at relpath (relative, "/" separated) be yielded by the filters?
+        # Sizes, links and inodes are not looked at here.
+        parts = relpath.split("/")
+        for i in range(1, len(parts)):
+            if self.excluded_dir("/".join(parts[:i])):
+                return False
+        return not (self.exclude and self._excluded(parts[-1], relpath)) and \
+            self._included(parts[-1], relpath)
+
+    def accepts(self, relpath, st, is_link=False):
+        # The depth, link, size and file system filters of the walk, for a file found some
+        # other way (watch mode). st is the stat of the file, of its target for a link.
+        if is_link and self.symlinks == "skip":
+            return False
+        if self.max_depth is not None and relpath.count("/") > self.max_depth:
+            return False
+        if not stat.S_ISREG(st.st_mode):
+            return False
+        if self.min_size is not None and st.st_size < self.min_size:
+            return False
+        if self.max_size is not None and st.st_size > self.max_size:
+            return False
+        return not self.same_fs or st.st_dev == os.stat(self.root).st_dev
+
+    def __iter__(self):
+        root_st = os.stat(self.root)
+        seen_dirs = {(root_st.st_dev, root_st.st_ino)}
+        seen_files = set()
+        filtered = bool(self.include or self.exclude)
+        sized = self.min_size is not None or self.max_size is not None
+        min_size = self.min_size or 0
+        max_size = self.max_size if self.max_size is not None else float("inf")
+        stats = self.stats
+        stack = [(self.root, "", 0)]
+        while stack:
+            path, rel, depth = stack.pop()
+            try:
+                with os.scandir(path) as it:
+                    entries = sorted(it, key=_NAME)
+            except OSError as e:
+                stats.errors.append((path, e))
+                continue
+            stats.dirs += 1
+            subdirs = []
+            for entry in entries:
+                name = entry.name
+                relpath = (f"{rel}/{name}" if rel else name) if filtered else None
+                if self.exclude and self._excluded(name, relpath):
+                    stats.excluded += 1
+                    continue
+                try:
+                    # is_symlink and is_dir come from d_type, only stat() may cost a syscall.
+                    is_link = entry.is_symlink()
+                    if is_link and self.symlinks == "skip":
+                        continue
+                    if entry.is_dir(follow_symlinks=not is_link or self.symlinks == "follow"):
+                        if self.max_depth is None or depth < self.max_depth:
+                            subdirs.append((entry, relpath))
+                        continue
+                    st = entry.stat()
+                except OSError as e:
+                    stats.errors.append((entry.path, e))
+                    continue
+                if not stat.S_ISREG(st.st_mode):
+                    continue
+                if filtered and not self._included(name, relpath):
+                    continue
+                if sized and not min_size <= st.st_size <= max_size:
+                    stats.excluded += 1
+                    continue
+                if self.same_fs and st.st_dev != root_st.st_dev:
+                    continue
+                if st.st_nlink > 1:
+                    # Only multiply linked files are remembered, so the set stays small.
+                    key = (st.st_dev, st.st_ino)
+                    if key in seen_files:
+                        stats.hardlinks += 1
+                        if self.dedupe_inodes:
+                            continue
+                    else:
+                        seen_files.add(key)
+                stats.files += 1
+                yield FileEntry(entry.path, st)
+            for entry, relpath in reversed(subdirs):
+                try:
+                    st = entry.stat()
+                except OSError as e:
+                    stats.errors.append((entry.path, e))
+                    continue
+                if self.same_fs and st.st_dev != root_st.st_dev:
+                    continue
+                key = (st.st_dev, st.st_ino)
+                if key in seen_dirs:
+                    # Symlink loop or a directory reached twice through links.
+                    continue
+                seen_dirs.add(key)
+                stack.append((entry.path, relpath, depth + 1))
+
+
+def walk(root, **options):
+    return iter(Walker(root, **options))
+
+
+def walk_paths(root, **options):
+    for entry in Walker(root, **options):
+        yield entry.path
@@ -0,0 +1,302 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+from .parallel import DEFAULT_WORKERS, hash_many
+from .walker import Walker
+
+# A file must stay untouched this long before it is hashed, so files that are still being
+# written are hashed once when the writer is done and not on every write.
+SETTLE = 2.0
+POLL_INTERVAL = 10.0
+BACKENDS = ("auto", "inotify", "poll")
+
+ADDED, MODIFIED, DELETED, ERROR = "ADDED", "MODIFIED", "DELETED", "ERROR"
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT = struct.Struct("iIII")
+
+
+class Event:
+    def __init__(self, kind, path, size=None, digest=None, old_digest=None, error=None):
+        self.kind = kind
+        self.path = path
+        self.size = size
+        self.digest = digest
+        self.old_digest = old_digest
+        self.error = error
+        self.time = time.time()
+
+    def as_dict(self):
+        return {k: v for k, v in (("event", self.kind), ("path", self.path), ("size", self.size),
+                                  ("digest", self.digest), ("old_digest", self.old_digest),
+                                  ("error", None if self.error is None else str(self.error)),
+                                  ("time", round(self.time, 3))) if v is not None}
+
+
+class _Inotify:
+    MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+            | IN_DELETE | IN_ONLYDIR)
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.dirs = {}
+
+    def add(self, path):
+        wd = self._add_watch(self.fd, os.fsencode(path), self.MASK)
+        if wd < 0:
+            # ENOSPC here means fs.inotify.max_user_watches is exhausted.
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        self.dirs[wd] = path
+
+    def read(self, timeout):
+        # Blocks until events arrive or timeout (None = forever) passes; returns a list of
+        # (directory, mask, name). An idle tree costs no CPU at all here.
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return []
+        events, i = [], 0
+        while i < len(data):
+            wd, mask, _cookie, length = _EVENT.unpack_from(data, i)
+            name = data[i + _EVENT.size:i + _EVENT.size + length].rstrip(b"\0")
+            i += _EVENT.size + length
+            events.append((self.dirs.get(wd), mask, os.fsdecode(name)))
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Watcher:
+    # Keeps path -> (size, mtime_ns, digest) for a tree and turns changes into Events.
+    # Changes are noticed with inotify on Linux and by re-walking every `interval` seconds
+    # elsewhere (or with backend="poll"); only new and changed files are hashed again.
+    def __init__(self, root, algo="sha256", workers=DEFAULT_WORKERS, cache=None, settle=SETTLE,
+                 interval=POLL_INTERVAL, backend="auto", walk_options=None):
+        if backend not in BACKENDS:
+            raise ValueError(f"backend must be one of {BACKENDS}")
+        self.root = os.path.abspath(root)
+        self.algo = algo
+        self.workers = workers
+        self.cache = cache
+        self.settle = settle
+        self.interval = interval
+        self.backend = backend
+        self.walker = Walker(self.root, **{**(walk_options or {}), "dedupe_inodes": False})
+        self.index = {}
+        # path -> (deadline, size, mtime_ns); size/mtime are None when inotify scheduled it.
+        self._pending = {}
+        self._inotify = None
+        self._next_poll = None
+        self._started = False
+
+    def _wanted(self, path):
+        rel = os.path.relpath(path, self.root)
+        return rel != os.curdir and self.walker.wanted(rel.replace(os.sep, "/"))
+
+    def _schedule(self, path, size=None, mtime_ns=None):
+        self._pending[path] = (time.monotonic() + self.settle, size, mtime_ns)
+
+    def _start_backend(self):
+        if self.backend in ("auto", "inotify") and sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify()
+                self._watch_tree(self.root)
+                self.backend = "inotify"
+                return
+            except (OSError, AttributeError):
+                if self._inotify is not None:
+                    self._inotify.close()
+                    self._inotify = None
+                if self.backend == "inotify":
+                    raise
+        self.backend = "poll"
+        self._next_poll = time.monotonic() + self.interval
+
+    def _watch_tree(self, top, schedule=False):
+        # Watches every directory below top; new directories get their files scheduled
+        # because they may have been filled before the watch was in place.
+        for dirpath, dirs, files in os.walk(top):
+            rel = os.path.relpath(dirpath, self.root).replace(os.sep, "/")
+            dirs[:] = [d for d in dirs
+                       if not self.walker.excluded_dir(d if rel == os.curdir else f"{rel}/{d}")]
+            self._inotify.add(dirpath)
+            if schedule:
+                for name in files:
+                    path = os.path.join(dirpath, name)
+                    if self._wanted(path):
+                        self._schedule(path)
+
+    def scan(self, job=None):
+        # Builds the index; returns ERROR events for files that could not be hashed. The
+        # backend starts first so nothing changed during the scan is lost.
+        self._start_backend()
+        self._started = True
+        entries = {}
+
+        def paths():
+            for entry in self.walker:
+                entries[entry.path] = entry
+                yield entry.path
+
+        errors = []
+        for path, digests, error in hash_many(paths(), [self.algo], self.workers, cache=self.cache, job=job):
+            entry = entries.pop(path)
+            if error is None:
+                self.index[path] = (entry.size, entry.mtime_ns, digests[self.algo])
+            else:
+                errors.append(Event(ERROR, path, entry.size, error=error))
+        return errors
+
+    def _poll(self):
+        # One stat per file from the walker, no reads: unchanged files cost nothing more.
+        seen = set()
+        for entry in self.walker:
+            seen.add(entry.path)
+            known = self.index.get(entry.path)
+            if known is None or known[:2] != (entry.size, entry.mtime_ns):
+                if entry.path not in self._pending:
+                    self._schedule(entry.path, entry.size, entry.mtime_ns)
+        for path in self.index.keys() - seen:
+            self._schedule(path)
+        if self._inotify is None:
+            # With inotify this was an overflow rescan; there is no next one to arm.
+            self._next_poll = time.monotonic() + self.interval
+
+    def _handle(self, events):
+        for directory, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                # The kernel dropped events; one full comparison catches up.
+                self._poll()
+                continue
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    rel = os.path.relpath(path, self.root).replace(os.sep, "/")
+                    if not self.walker.excluded_dir(rel):
+                        try:
+                            self._watch_tree(path, schedule=True)
+                        except OSError:
+                            pass
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    prefix = path + os.sep
+                    for known in [p for p in self.index if p.startswith(prefix)]:
+                        self._schedule(known)
+            elif self._wanted(path):
+                self._schedule(path)
+
+    def _wait(self, job):
+        now = time.monotonic()
+        deadlines = [d for d, _, _ in self._pending.values()]
+        if self._next_poll is not None:
+            deadlines.append(self._next_poll)
+        timeout = max(0.0, min(deadlines) - now) if deadlines else None
+        if job is not None:
+            # Wake up now and then so a cancel is noticed.
+            timeout = 1.0 if timeout is None else min(timeout, 1.0)
+        if self._inotify is not None:
+            self._handle(self._inotify.read(timeout))
+        else:
+            time.sleep(timeout)
+            if time.monotonic() >= self._next_poll:
+                self._poll()
+
+    def _settled(self, job):
+        now = time.monotonic()
+        due = []
+        for path, (deadline, size, mtime_ns) in list(self._pending.items()):
+            if deadline > now:
+                continue
+            del self._pending[path]
+            try:
+                st = os.stat(path)
+                is_link = os.path.islink(path)
+            except FileNotFoundError:
+                st = None
+            except OSError as e:
+                yield Event(ERROR, path, error=e)
+                continue
+            rel = os.path.relpath(path, self.root).replace(os.sep, "/")
+            if st is None or not self.walker.accepts(rel, st, is_link):
+                # Gone, or no longer passes the size/link filters the tree walk applies.
+                known = self.index.pop(path, None)
+                if known is not None:
+                    yield Event(DELETED, path, old_digest=known[2])
+                continue
+            if size is not None and (size, mtime_ns) != (st.st_size, st.st_mtime_ns):
+                # Still changing since the poll that noticed it.
+                self._schedule(path, st.st_size, st.st_mtime_ns)
+                continue
+            known = self.index.get(path)
+            if known is not None and known[:2] == (st.st_size, st.st_mtime_ns):
+                continue
+            due.append((path, st))
+        if not due:
+            return
+        before = dict(due)
+        for path, digests, error in hash_many(before, [self.algo], self.workers, cache=self.cache, job=job):
+            st = before[path]
+            try:
+                after = os.stat(path)
+            except OSError:
+                after = None
+            if after is None or (after.st_size, after.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+                # Written to while we hashed it: try again once it has settled.
+                self._schedule(path)
+                continue
+            if error is not None:
+                yield Event(ERROR, path, st.st_size, error=error)
+                continue
+            digest = digests[self.algo]
+            known = self.index.get(path)
+            self.index[path] = (st.st_size, st.st_mtime_ns, digest)
+            if known is None:
+                yield Event(ADDED, path, st.st_size, digest)
+            elif known[2] != digest:
+                yield Event(MODIFIED, path, st.st_size, digest, known[2])
+
+    def events(self, job=None):
+        # Endless stream of Events; stops when job is cancelled (raises jobs.Cancelled).
+        if not self._started:
+            yield from self.scan(job)
+        while True:
+            if job is not None:
+                job.check()
+            self._wait(job)
+            yield from self._settled(job)
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
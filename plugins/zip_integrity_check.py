@@ -1,7 +1,12 @@
+from hashcore.archive import TAR_SUFFIXES, verify_archive
+
+EXTENSIONS = (".zip",) + TAR_SUFFIXES
+
 def check(file_path):
-    import zipfile
     try:
-        with zipfile.ZipFile(file_path, 'r') as z:
-            return z.testzip() is None
+        return verify_archive(file_path).ok
     except Exception:
         return False
+
+def check_many(paths):
+    return [check(p) for p in paths]